@@ -0,0 +1,412 @@
+"""
+Ingest-time extraction of decisions and action items
+
+When a document is saved, its summary is turned once into a structured record
+(decisions; action items with owner, organization, due date and priority) and
+stored per project in `<project>/_action_items.json`, keyed by document ID.
+Recipient emails query this index by person and organization instead of
+asking the LLM to re-read the whole project history.
+
+The LLM extracts the record as JSON. In demo mode, or when that call fails, a
+heuristic parser reads the markdown of the summary (TASK_TEMPLATE-style
+"[높음]", "담당:", "마감일:" markers, action and ownership sections, and
+tables with a 담당 column). Documents still unindexed when a query runs
+(imports, older data) get the heuristic parser only, so a recipient's email
+never waits on extraction calls; the prefetch and `rebuild` use the LLM.
+
+Usage (from the repository root):
+    python action_items.py rebuild [--project NAME ...]
+    python action_items.py query PROJECT [--person NAME] [--organization ORG]
+"""
+import argparse
+import json
+import re
+from datetime import datetime
+from pathlib import Path
+
+from atomic_files import atomic_write_json, dir_lock
+from llm import extract_structured_with_llm
+from llm_scheduler import BATCH, job_context
+from tracing import traced
+
+INDEX_FILENAME = "_action_items.json"
+INDEX_VERSION = 2  # 2: records of linked near-duplicates carry duplicate_of
+DEFAULT_ORGANIZATIONS = ["사업개발", "제품팀", "마케팅", "기획", "개발", "디자인", "경영지원"]
+PRIORITIES = ("높음", "중간", "낮음")
+
+_PRIORITY_ALIASES = {
+    "높음": "높음", "상": "높음", "high": "높음", "p0": "높음", "p1": "높음", "긴급": "높음",
+    "중간": "중간", "중": "중간", "보통": "중간", "medium": "중간", "p2": "중간",
+    "낮음": "낮음", "하": "낮음", "low": "낮음", "p3": "낮음"
+}
+_BULLET = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+(.*)$")
+_HEADING = re.compile(r"^\s*#{1,6}\s*(.*)$")
+_BOLD_LABEL = re.compile(r"^\*\*([^*]+)\*\*\s*[:：]?\s*(.*)$")
+# A marker value ends at a bracket, comma or pipe, or where the next "key:" marker starts
+_VALUE = r"([^\]\),|:：]+?)(?=\s*(?:[\]\),|]|$|\S+\s*[:：]))"
+_PRIORITY_TAG = re.compile(r"\[(높음|중간|낮음)\]|우선순위\s*[:：]\s*" + _VALUE + r"|\b(P[0-3])\b", re.IGNORECASE)
+_DUE = re.compile(r"(?:마감일?|기한|완료\s*목표일|due)\s*[:：]\s*" + _VALUE, re.IGNORECASE)
+_DATE = re.compile(r"\d{4}[-./]\d{1,2}[-./]\d{1,2}|\d{1,2}월\s*\d{1,2}일|\b\d{1,2}/\d{1,2}\b")
+_OWNER = re.compile(r"(?:담당자?|owner)\s*[:：]\s*" + _VALUE, re.IGNORECASE)
+_MENTION = re.compile(r"@([\w가-힣]+)")
+_ORGANIZATION = re.compile(r"(?:조직|부서|소속)\s*[:：]\s*" + _VALUE)
+_TAGS = re.compile(r"\[[^\]]*\]|\*\*")
+_EMPTY_GROUP = re.compile(r"\(\s*[,/\s]*\)")
+
+_DECISION_SECTION = ("결정", "decision")
+_ACTION_SECTION = ("액션", "action", "할 일", "to-do", "todo", "next step", "다음 단계", "후속")
+_OWNERSHIP_SECTION = ("담당", "책임", "ownership", "owner")
+
+
+def _clean(value):
+    value = (value or "").strip().strip("*").strip()
+    return value or None
+
+
+def _normalize_priority(value):
+    if not value:
+        return None
+    return _PRIORITY_ALIASES.get(value.strip().lower())
+
+
+def _find_organization(text, owner=None):
+    """Organization from an explicit "조직:" marker, else a known organization named as the owner"""
+    match = _ORGANIZATION.search(text or "")
+    if match:
+        return _clean(match.group(1))
+    for organization in DEFAULT_ORGANIZATIONS:
+        if owner and organization in owner:
+            return organization
+    return None
+
+
+def _parse_item(text, owner=None):
+    """Build an action item from one line, reading inline owner/due/priority markers"""
+    priority_match = _PRIORITY_TAG.search(text)
+    priority = None
+    if priority_match:
+        priority = _normalize_priority(next(g for g in priority_match.groups() if g))
+    due_match = _DUE.search(text)
+    if due_match:
+        due_date = _clean(due_match.group(1))
+    else:
+        date_match = _DATE.search(text)
+        due_date = date_match.group(0) if date_match else None
+    owner_match = _OWNER.search(text) or _MENTION.search(text)
+    owner = _clean(owner_match.group(1)) if owner_match else owner
+
+    task = _TAGS.sub("", text)
+    task = _ORGANIZATION.sub("", _DUE.sub("", _OWNER.sub("", task)))
+    task = re.sub(r"\s{2,}", " ", _EMPTY_GROUP.sub("", task))
+    task = re.sub(r"^\s*(?:액션\s*아이템|액션명?)\s*[:：]\s*", "", task).strip(" :：-")
+    return normalize_item({
+        "task": task,
+        "owner": owner,
+        "organization": _find_organization(text, owner),
+        "due_date": due_date,
+        "priority": priority
+    })
+
+
+def normalize_item(item):
+    """Clean an extracted action item; None if it has no task"""
+    task = _clean(item.get("task"))
+    if not task or task.endswith(("목적 및 상세 내용",)):
+        return None
+    owner = _clean(item.get("owner"))
+    return {
+        "task": task,
+        "owner": owner,
+        "organization": _clean(item.get("organization")) or _find_organization(None, owner),
+        "due_date": _clean(item.get("due_date")),
+        "priority": _normalize_priority(item.get("priority"))
+    }
+
+
+def _table_rows(lines, start):
+    """Parse a markdown table starting at lines[start]; returns (rows as dicts, next index)"""
+    header = [c.strip().strip("*") for c in lines[start].strip().strip("|").split("|")]
+    rows = []
+    i = start + 1
+    while i < len(lines) and lines[i].strip().startswith("|"):
+        cells = [c.strip() for c in lines[i].strip().strip("|").split("|")]
+        if not all(set(c) <= set("-: ") for c in cells):
+            rows.append(dict(zip(header, cells)))
+        i += 1
+    return rows, i
+
+
+def _column(row, *names):
+    for key, value in row.items():
+        if any(name in key.lower() for name in names):
+            return value
+    return None
+
+
+def extract_heuristic(summary):
+    """Extract decisions and action items from a markdown summary without the LLM"""
+    decisions = []
+    action_items = []
+    section = None
+    owner = None
+    lines = summary.splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        heading = _HEADING.match(line)
+        if heading:
+            title = heading.group(1).lower()
+            if any(k in title for k in _DECISION_SECTION):
+                section = "decision"
+            elif any(k in title for k in _OWNERSHIP_SECTION):
+                section = "ownership"
+            elif any(k in title for k in _ACTION_SECTION):
+                section = "action"
+            elif not heading.group(0).lstrip().startswith("###"):
+                # A new top-level section ends the previous one; ### headings refine it
+                section = None
+            owner = None
+            i += 1
+            continue
+
+        if line.strip().startswith("|") and i + 1 < len(lines) and lines[i + 1].strip().startswith("|"):
+            rows, i = _table_rows(lines, i)
+            for row in rows:
+                task = _column(row, "액션", "할 일", "업무", "task", "내용")
+                row_owner = _column(row, "담당", "owner")
+                if task and (row_owner or section in ("action", "ownership")):
+                    item = normalize_item({
+                        "task": task, "owner": row_owner,
+                        "organization": _column(row, "조직", "부서"),
+                        "due_date": _column(row, "마감", "기한", "목표일", "due"),
+                        "priority": _column(row, "우선순위", "priority")
+                    })
+                    if item:
+                        action_items.append(item)
+            continue
+
+        bullet = _BULLET.match(line)
+        text = bullet.group(1).strip() if bullet else line.strip()
+        i += 1
+        if not text:
+            continue
+        if re.match(r"^\**\s*결정(?:\s*사항)?\s*\**\s*[:：]", text):
+            decisions.append({"text": _clean(_TAGS.sub("", text.split(":", 1)[-1].split("：", 1)[-1]))})
+            continue
+        if not bullet:
+            continue
+
+        label = _BOLD_LABEL.match(text)
+        indented = line[:len(line) - len(line.lstrip())] != ""
+        if section == "decision":
+            decision = _clean(_TAGS.sub("", text))
+            if decision and not decision.endswith(":"):
+                decisions.append({"text": decision})
+        elif section == "ownership" and label and not label.group(2) and not indented:
+            # "- **개인명/팀명**:" starts a block of that owner's sub-bullets
+            owner = _clean(label.group(1))
+        elif section == "ownership" and owner and indented:
+            if re.match(r"^(?:액션\s*아이템|할 일)\s*[:：]", text):
+                item = _parse_item(text, owner)
+                if item:
+                    action_items.append(item)
+            elif _DUE.match(text) and action_items and action_items[-1]["owner"] == owner:
+                action_items[-1]["due_date"] = _clean(_DUE.match(text).group(1))
+        elif section in ("action", "ownership") or _OWNER.search(text):
+            if label and label.group(2) and not label.group(1).startswith("["):
+                # "- **다음 단계 1**: 내용 [우선순위: 높음]": the bold label is not part of the task
+                text = label.group(2)
+            item = _parse_item(text)
+            if item:
+                action_items.append(item)
+
+    return {"decisions": [d for d in decisions if d["text"]], "action_items": action_items}
+
+
+@traced()
+def extract_record(summary, use_llm=True):
+    """Structured record of a summary: LLM JSON extraction, else the heuristic parser"""
+    extracted = extract_structured_with_llm(summary) if use_llm else None
+    if isinstance(extracted, dict):
+        return {
+            "decisions": [
+                {"text": _clean(d.get("text") if isinstance(d, dict) else str(d))}
+                for d in extracted.get("decisions") or [] if d
+            ],
+            "action_items": [
+                item for item in (normalize_item(i) for i in extracted.get("action_items") or [] if isinstance(i, dict))
+                if item
+            ],
+            "extracted_by": "llm"
+        }
+    return {**extract_heuristic(summary), "extracted_by": "heuristic"}
+
+
+def _index_path(project_dir):
+    return Path(project_dir) / INDEX_FILENAME
+
+
+def load_index(project_dir):
+    """Get the project's action item index: {"version": N, "documents": {document_id: record}}"""
+    path = _index_path(project_dir)
+    if not path.exists():
+        return {"version": INDEX_VERSION, "documents": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_index(project_dir, index):
+    """Write the index; call with dir_lock(project_dir) held"""
+    atomic_write_json(_index_path(project_dir), index)
+
+
+def index_document(project_dir, metadata, use_llm=True):
+    """Extract and store the record of one saved document (replacing any previous one)"""
+    record = extract_record(metadata.get("content") or "", use_llm)
+    record["processed_at"] = metadata.get("processed_at")
+    record["sync_number"] = metadata.get("sync_number")
+    if metadata.get("duplicate_of"):
+        # A linked near-duplicate upload: its items are already in the document it duplicates
+        record["duplicate_of"] = metadata["duplicate_of"]
+    record["indexed_at"] = datetime.now().isoformat()
+    with dir_lock(project_dir):
+        index = load_index(project_dir)
+        index["documents"][metadata["generated_filename"]] = record
+        _save_index(project_dir, index)
+    return record
+
+
+def remove_documents(project_dir, document_ids):
+    """Drop the records of deleted documents"""
+    with dir_lock(project_dir):
+        index = load_index(project_dir)
+        removed = [i for i in document_ids if index["documents"].pop(i, None) is not None]
+        if removed:
+            _save_index(project_dir, index)
+
+
+def _upgrade_index(project_name):
+    """Bring an index written by an older version up to INDEX_VERSION without re-extracting"""
+    import storage
+
+    project_dir = storage.DATA_DIR / project_name
+    with dir_lock(project_dir):
+        index = load_index(project_dir)
+        for document_id, record in index["documents"].items():
+            metadata = storage.get_document(project_name, document_id)
+            if metadata and metadata.get("duplicate_of"):
+                record["duplicate_of"] = metadata["duplicate_of"]
+        index["version"] = INDEX_VERSION
+        _save_index(project_dir, index)
+
+
+def sync_index(project_name, use_llm=True):
+    """Index documents saved without a record (imports, older data) and drop records of deleted ones"""
+    import storage
+
+    project_dir = storage.DATA_DIR / project_name
+    if load_index(project_dir).get("version", 1) < INDEX_VERSION:
+        _upgrade_index(project_name)
+    live = set(storage.list_document_ids(project_name))
+    indexed = set(load_index(project_dir)["documents"])
+    if indexed - live:
+        remove_documents(project_dir, indexed - live)
+    for document_id in sorted(live - indexed):
+        metadata = storage.get_document(project_name, document_id)
+        if metadata and metadata.get("generated_filename") == document_id:
+            index_document(project_dir, metadata, use_llm)
+    return len(live - indexed)
+
+
+def _name_tokens(name):
+    """'문희철(henry)' -> {'문희철', 'henry'}"""
+    return {t for t in re.split(r"[\s()（）/,]+", (name or "").lower()) if t}
+
+
+def matches_person(owner, person_name):
+    """Whether an item's owner refers to the recipient (any name token in common)"""
+    return bool(owner) and bool(_name_tokens(owner) & _name_tokens(person_name))
+
+
+def _sort_key(item):
+    priority = PRIORITIES.index(item["priority"]) if item.get("priority") in PRIORITIES else len(PRIORITIES)
+    return priority, item.get("due_date") or "~", item.get("processed_at") or ""
+
+
+@traced()
+def query_items(project_name, person=None, organization=None, document_ids=None):
+    """Decisions and the action items owned by `person` or `organization`, most urgent first
+
+    `document_ids` limits the query to those documents (e.g. the ones changed since the last send).
+    """
+    import storage
+
+    # Interactive path: no extraction calls while the recipient waits for the email
+    sync_index(project_name, use_llm=False)
+    index = load_index(storage.DATA_DIR / project_name)
+    decisions = []
+    action_items = []
+    for document_id, record in sorted(index["documents"].items(), key=lambda kv: kv[1].get("processed_at") or ""):
+        if document_ids is not None and document_id not in document_ids:
+            continue
+        if record.get("duplicate_of"):
+            continue  # counted once, as in the combined content of generate_role_based_email
+        for decision in record.get("decisions", []):
+            decisions.append({**decision, "document_id": document_id})
+        for item in record.get("action_items", []):
+            by_person = person and matches_person(item.get("owner"), person)
+            by_organization = organization and item.get("organization") and \
+                item["organization"].lower() == organization.strip().lower()
+            if by_person or by_organization or (person is None and organization is None):
+                action_items.append({**item, "document_id": document_id, "processed_at": record.get("processed_at")})
+    action_items.sort(key=_sort_key)
+    return {"decisions": decisions, "action_items": action_items}
+
+
+def format_for_prompt(result):
+    """Markdown of query_items output for the email prompt"""
+    lines = ["**결정 사항:**"]
+    lines += [f"- {d['text']}" for d in result["decisions"]] or ["- (없음)"]
+    lines += ["", "**액션 아이템:**"]
+    for item in result["action_items"]:
+        details = [
+            f"담당: {item['owner'] or item['organization'] or '미정'}",
+            f"우선순위: {item['priority'] or '미정'}",
+            f"마감일: {item['due_date'] or '미정'}"
+        ]
+        lines.append(f"- {item['task']} ({', '.join(details)})")
+    if not result["action_items"]:
+        lines.append("- (없음)")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Decision and action item index of TF projects")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rebuild_parser = subparsers.add_parser("rebuild", help="Re-extract every document's record")
+    rebuild_parser.add_argument("--project", action="append", help="Project to rebuild (repeatable, default: all)")
+
+    query_parser = subparsers.add_parser("query", help="List a recipient's action items")
+    query_parser.add_argument("project")
+    query_parser.add_argument("--person")
+    query_parser.add_argument("--organization")
+
+    args = parser.parse_args(argv)
+
+    import storage
+
+    if args.command == "rebuild":
+        counts = {}
+        for project_name in args.project or storage.get_all_projects():
+            _index_path(storage.DATA_DIR / project_name).unlink(missing_ok=True)
+            with job_context(BATCH, project_name):
+                counts[project_name] = sync_index(project_name)
+        print(json.dumps(counts, ensure_ascii=False, indent=2))
+    else:
+        result = query_items(args.project, args.person, args.organization)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
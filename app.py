@@ -1,38 +1,55 @@
 import streamlit as st
 import os
-import json
-from datetime import datetime
-from pathlib import Path
-import openai
 import requests
 from dotenv import load_dotenv
 import pandas as pd
-import PyPDF2
-import docx
-import io
+import altair as alt
+from contextlib import contextmanager
 
 # Import templates from separate file
 from templates import (
-    DEMO_CONTENT_TEMPLATE,
-    DEMO_EMAIL_TEMPLATE, 
-    SYSTEM_PROMPT_TEMPLATE,
-    USER_PROMPT_TEMPLATE,
-    get_predefined_templates
+    get_predefined_templates,
+    build_custom_template
 )
+# Import storage and file reading helpers from separate files
+from storage import (
+    DATA_DIR,
+    save_project_file,
+    get_document,
+    transcript_delta,
+    append_project_file,
+    get_project_files_since,
+    document_cursor,
+    list_document_ids,
+    get_project_summary,
+    list_project_documents,
+    project_version,
+    get_all_projects,
+    delete_document,
+    delete_documents,
+    delete_entire_project
+)
+from dedup import DUPLICATE_SIMILARITY_THRESHOLD, compute_signature, find_near_duplicates, missing_signatures
+from file_reader import MEMORY_BUDGET_PREFIX, UPLOAD_TOO_LARGE_PREFIX, read_file_content
+from llm_scheduler import INTERACTIVE, get_scheduler, job_context
+from llm import EMAIL_ERROR_PREFIX, LLM_ERROR_PREFIX, is_demo_mode, process_with_llm, merge_with_llm, generate_role_based_email
+from template_registry import describe_template, get_template_text
+from channel_delivery import deliver_message, get_rooms
+from action_items import DEFAULT_ORGANIZATIONS, format_for_prompt, query_items
+from send_ledger import get_last_send, record_send
+from prefetch import get_context, prefetch
+from prefetch import stats as prefetch_stats
+from tracing import span, traced, start_trace, get_recent_traces, clear_traces, flatten_trace, aggregate_spans
 
 # Load environment variables
 load_dotenv()
 
-# Configure APIs
-openai.api_key = os.getenv("OPENAI_API_KEY", "demo_key")
+# Configure APIs (OpenAI is configured in llm.py)
 MISO_API_KEY = os.getenv("MISO_API_KEY", "")
 MISO_DATASET_ID = os.getenv("MISO_DATASET_ID", "")
 MISO_BASE_URL = "https://api.holdings.miso.gs/ext/v1"
 
-# Channel.io API configuration
-CHANNEL_API_URL = os.getenv("CHANNEL_API_URL", "")
-CHANNEL_ACCESS_KEY = os.getenv("CHANNEL_ACCESS_KEY", "")
-CHANNEL_ACCESS_SECRET = os.getenv("CHANNEL_ACCESS_SECRET", "")
+# Channel.io API configuration lives in channel_delivery.py
 
 # Page configuration
 st.set_page_config(
@@ -41,130 +58,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Create data directory if it doesn't exist
-DATA_DIR = Path("tf_projects")
-DATA_DIR.mkdir(exist_ok=True)
-
-
-
-def save_project_file(project_name, filename, content, template_used):
-    """Save processed file content to project folder"""
-    project_dir = DATA_DIR / project_name
-    project_dir.mkdir(exist_ok=True)
-    
-    # Generate file number based on existing files
-    existing_files = list(project_dir.glob("*.txt"))
-    sync_number = len(existing_files) + 1
-    
-    # Save with convention: 날짜_sync_번호
-    today = datetime.now().strftime('%Y%m%d')
-    generated_filename = f"{today}_sync_{sync_number}"
-    file_path = project_dir / f"{generated_filename}.txt"
-    
-    # Create metadata
-    metadata = {
-        "original_filename": filename,
-        "template_used": template_used,
-        "processed_at": datetime.now().isoformat(),
-        "content": content,
-        "sync_number": sync_number,
-        "date": today,
-        "generated_filename": generated_filename
-    }
-    
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(metadata, f, ensure_ascii=False, indent=2)
-    
-    return file_path, generated_filename
-
-
-def get_project_files(project_name):
-    """Get all files for a specific project"""
-    project_dir = DATA_DIR / project_name
-    if not project_dir.exists():
-        return []
-    
-    files = []
-    for file_path in project_dir.glob("*.txt"):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                metadata = json.load(f)
-                files.append(metadata)
-        except:
-            continue
-    
-    return files
-
-def get_all_projects():
-    """Get list of all projects"""
-    if not DATA_DIR.exists():
-        return []
-    return [d.name for d in DATA_DIR.iterdir() if d.is_dir()]
-
-
-def delete_project_file(project_name, file_index):
-    """Delete a specific file from project"""
-    project_dir = DATA_DIR / project_name
-    if not project_dir.exists():
-        return False
-    
-    files = list(project_dir.glob("*.txt"))
-    if 0 <= file_index < len(files):
-        files[file_index].unlink()
-        return True
-    return False
-
-
-def delete_entire_project(project_name):
-    """Delete entire project and all its files"""
-    project_dir = DATA_DIR / project_name
-    if not project_dir.exists():
-        return False
-    
-    # Delete all files in the project
-    for file_path in project_dir.glob("*.txt"):
-        file_path.unlink()
-    
-    # Delete the project directory
-    project_dir.rmdir()
-    return True
-
-
-def read_file_content(uploaded_file):
-    """Read content from uploaded file based on file type"""
-    try:
-        file_type = uploaded_file.type
-        file_name = uploaded_file.name.lower()
-        
-        if file_type.startswith('text/') or file_name.endswith('.txt') or file_name.endswith('.md'):
-            # Text files
-            content = str(uploaded_file.read(), "utf-8")
-            
-        elif file_name.endswith('.pdf'):
-            # PDF files
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(uploaded_file.read()))
-            content = ""
-            for page in pdf_reader.pages:
-                content += page.extract_text() + "\n"
-                
-        elif file_name.endswith('.docx'):
-            # Word documents
-            doc = docx.Document(io.BytesIO(uploaded_file.read()))
-            content = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-            
-        else:
-            # Try to read as text file
-            try:
-                content = str(uploaded_file.read(), "utf-8")
-            except UnicodeDecodeError:
-                content = f"파일 형식을 지원하지 않습니다: {file_name}\n지원 형식: .txt, .md, .pdf, .docx"
-        
-        return content
-        
-    except Exception as e:
-        return f"파일 읽기 중 오류가 발생했습니다: {str(e)}"
-
 
+@traced()
 def upload_to_miso_api(document_name, processed_text):
     """Upload processed text to MISO API as a document"""
     if not MISO_API_KEY or not MISO_DATASET_ID:
@@ -177,7 +72,8 @@ def upload_to_miso_api(document_name, processed_text):
     try:
         # API 연결 테스트 먼저 수행
         test_url = f"{MISO_BASE_URL}"
-        test_response = requests.get(test_url, timeout=10)
+        with span("miso.connection_test"):
+            test_response = requests.get(test_url, timeout=10)
         
         if test_response.status_code != 200:
             return {
@@ -203,7 +99,8 @@ def upload_to_miso_api(document_name, processed_text):
             }
         }
         
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        with span("miso.upload"):
+            response = requests.post(url, headers=headers, json=payload, timeout=30)
         
         if response.status_code == 200:
             result = response.json()
@@ -255,115 +152,234 @@ def upload_to_miso_api(document_name, processed_text):
         }
 
 
+@traced()
 def send_to_channel(email_content, person_name, project_name):
-    """Send email content to Channel.io group"""
-    try:
-        headers = {
-            "accept": "application/json",
-            "x-access-key": CHANNEL_ACCESS_KEY,
-            "x-access-secret": CHANNEL_ACCESS_SECRET,
-            "Content-Type": "application/json"
+    """Send email content to every configured Channel.io group room"""
+    if not get_rooms():
+        return {
+            "success": False,
+            "message": "채널 방이 설정되지 않았습니다. CHANNEL_API_URL 또는 CHANNEL_ROOMS를 설정해주세요.",
+            "rooms": []
         }
-        
+    
+    try:
         # Create message for Channel.io
         message_text = f"{person_name}님을 위한 {project_name} TF 프로젝트 맞춤 요약이 생성되었습니다.\n\n{email_content}"
         
-        payload = {
-            "blocks": [
-                {
-                    "type": "text",
-                    "value": message_text
-                }
-            ]
-        }
-        
-        response = requests.post(CHANNEL_API_URL, headers=headers, json=payload, timeout=10)
+        results = deliver_message(message_text)
+        failed = [r for r in results if not r["success"]]
         
-        if response.status_code == 200 or response.status_code == 201:
+        if not failed:
             return {
                 "success": True,
-                "message": "채널 방에 성공적으로 전송되었습니다!"
+                "message": f"채널 방 {len(results)}곳에 성공적으로 전송되었습니다!",
+                "rooms": results
             }
         else:
             return {
                 "success": False,
-                "message": f"채널 전송 실패: {response.status_code} - {response.text}"
+                "message": f"채널 방 {len(results)}곳 중 {len(failed)}곳 전송 실패: " + ", ".join(r["room"] for r in failed),
+                "rooms": results
             }
             
     except Exception as e:
         return {
             "success": False,
-            "message": f"채널 전송 중 오류 발생: {str(e)}"
+            "message": f"채널 전송 중 오류 발생: {str(e)}",
+            "rooms": []
         }
 
 
-def process_with_llm(content, template):
-    """Process file content using OpenAI LLM with template"""
-    # Check if API key is properly configured
-    if not openai.api_key or openai.api_key == "demo_key":
-        return DEMO_CONTENT_TEMPLATE.format(content_preview=content[:100])
-    
-    try:
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": f"다음 템플릿을 사용하여 제공된 내용을 정리하고 구조화해주세요:\n\n{template}"},
-                {"role": "user", "content": f"다음 내용을 위의 템플릿에 맞춰 정리해주세요:\n\n{content}"}
-            ],
-            max_tokens=2000,
-            temperature=0.7
-        )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"LLM 처리 중 오류가 발생했습니다: {str(e)}"
+def take_profile_request():
+    """Whether to profile this request; a checked "다음 요청 프로파일링" box is cleared once used"""
+    if not st.session_state.get("profile_next_request"):
+        return False
+    # The widget is already drawn in this run, so it is unchecked at the start of the next one
+    st.session_state["profile_request_taken"] = True
+    return True
 
 
-def generate_role_based_email(project_name, context_info, project_data):
-    """Generate role-based email using project data and 3-category context information"""
+@contextmanager
+def llm_queue_feedback(project_name):
+    """Run the block's LLM calls as interactive jobs of the project, showing the queue position while they wait"""
+    placeholder = st.empty()
     
-    # Combine all project content
-    combined_content = "\n\n".join([item["content"] for item in project_data])
-    
-    # Check if API key is properly configured
-    if not openai.api_key or openai.api_key == "demo_key":
-        return DEMO_EMAIL_TEMPLATE.format(
-            meeting_subject=context_info['meeting_subject'],
-            organization=context_info['organization'],
-            person_name=context_info['person_name'],
-            org_role_description=context_info['org_role_description'],
-            person_role=context_info['person_role'],
-            project_name=project_name
-        )
+    def on_wait(position, waited):
+        placeholder.info(f"⏳ LLM 요청 대기 중입니다: 대기열 {position}번째 ({waited:.0f}초 경과)")
     
     try:
-        system_prompt = SYSTEM_PROMPT_TEMPLATE.format(
-            person_name=context_info['person_name'],
-            organization=context_info['organization'],
-            meeting_subject=context_info['meeting_subject'],
-            org_role_description=context_info['org_role_description'],
-            person_role=context_info['person_role']
-        )
+        with job_context(INTERACTIVE, project_name, on_wait):
+            yield
+    finally:
+        placeholder.empty()
+
+
+def summarize_and_save(project_name, filename, content, template, signature, upload_to_miso, extra_metadata=None,
+                       replace_documents=()):
+    """Summarize extracted content with the LLM, save it to the project and show the result
+
+    Documents in `replace_documents` are deleted once the summary succeeded.
+    """
+    with llm_queue_feedback(project_name):
+        # Process with LLM
+        processed_content = process_with_llm(content, template)
+        if processed_content.startswith(LLM_ERROR_PREFIX):
+            # Do not store the error message as a meeting summary
+            st.error(processed_content)
+            return
+        
+        for document_key in replace_documents:
+            delete_document(project_name, document_key)
         
-        user_prompt = USER_PROMPT_TEMPLATE.format(
-            project_name=project_name,
-            meeting_subject=context_info['meeting_subject'],
-            combined_content=combined_content,
-            organization=context_info['organization'],
-            person_name=context_info['person_name']
+        # Save to project folder (action item extraction runs in the same job context)
+        saved_path, generated_filename = save_project_file(
+            project_name, 
+            filename, 
+            processed_content, 
+            template,
+            extra_metadata=extra_metadata,
+            signature=signature,
+            source_text=content
         )
+    
+    # Show success message for local save
+    st.success(f"✅ '{project_name}' 프로젝트에 저장 완료")
+    
+    # MISO API 업로드 (조용히 실행)
+    if upload_to_miso:
+        miso_result = upload_to_miso_api(generated_filename, processed_content)
+    
+    # Show processed content
+    with st.expander("정리된 미팅 기록 미리보기"):
+        st.markdown(processed_content)
+
+
+def summarize_and_append(project_name, generated_filename, filename, content, template, upload_to_miso):
+    """Merge only the new part of an ongoing meeting's transcript into an existing document"""
+    metadata = get_document(project_name, generated_filename)
+    if metadata is None:
+        st.error("이어서 추가할 문서를 찾을 수 없습니다.")
+        return
+    
+    # A re-uploaded growing transcript only contributes what follows the stored part
+    delta, continued = transcript_delta(metadata, content)
+    if not delta.strip():
+        st.info("새로 추가된 내용이 없습니다.")
+        return
+    
+    # Merge with the template the document was summarized with
+    document_template = get_template_text(metadata, DATA_DIR) or template
+    with llm_queue_feedback(project_name):
+        merged_content = merge_with_llm(metadata["content"], delta, document_template)
+        if merged_content.startswith(LLM_ERROR_PREFIX):
+            # Keep the existing summary rather than overwrite it with the error
+            st.error(merged_content)
+            return
         
-        response = openai.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.7
+        append_project_file(
+            project_name, generated_filename, filename, merged_content, content, continued,
+            delta_signature=compute_signature(delta)
         )
-        return response.choices[0].message.content
-    except Exception as e:
-        return f"이메일 생성 중 오류가 발생했습니다: {str(e)}"
+    st.success(f"✅ '{generated_filename}' 문서에 추가된 기록 {len(delta):,}자를 반영했습니다")
+    
+    if upload_to_miso:
+        miso_result = upload_to_miso_api(generated_filename, merged_content)
+    
+    with st.expander("정리된 미팅 기록 미리보기"):
+        st.markdown(merged_content)
+
+
+DOCUMENT_PAGE_SIZES = [20, 50, 100]
+EMAIL_SCOPES = ["지난 발송 이후 변경분만", "전체 미팅 기록"]
+DOCUMENT_SORT_OPTIONS = {
+    "처리일시 (최신순)": ("processed_at", True),
+    "처리일시 (오래된순)": ("processed_at", False),
+    "원본 파일명": ("original_filename", False),
+    "파일명": ("generated_filename", False)
+}
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def load_document_rows(project_name, version):
+    """Table rows of a project's documents; `version` invalidates the cache when the project changes"""
+    rows = []
+    for file_info in list_project_documents(project_name):
+        rows.append({
+            "파일명": file_info.get("generated_filename", "Unknown"),
+            "원본 파일명": file_info.get("original_filename", "Unknown"),
+            "처리일시": file_info.get("processed_at", "Unknown")[:19].replace("T", " "),
+            "템플릿 사용": describe_template(file_info),
+            "중복 연결": file_info.get("duplicate_of") or "",
+            "generated_filename": file_info.get("generated_filename", ""),
+            "original_filename": file_info.get("original_filename", ""),
+            "processed_at": file_info.get("processed_at", "")
+        })
+    return rows
+
+
+def render_document_table(project):
+    """Filter, sort and paginate a project's documents in one table with multi-row delete"""
+    version = project_version(project)
+    rows = load_document_rows(project, version)
+    if not rows:
+        st.warning("문서가 없습니다.")
+        return
+    
+    col1, col2, col3 = st.columns([3, 2, 1])
+    with col1:
+        query = st.text_input("검색 (파일명 / 원본 파일명)", key=f"doc_filter_{project}")
+    with col2:
+        sort_label = st.selectbox("정렬", list(DOCUMENT_SORT_OPTIONS), key=f"doc_sort_{project}")
+    with col3:
+        page_size = st.selectbox("페이지당", DOCUMENT_PAGE_SIZES, key=f"doc_page_size_{project}")
+    
+    if query:
+        needle = query.lower()
+        rows = [r for r in rows if needle in r["파일명"].lower() or needle in r["원본 파일명"].lower()]
+    sort_key, descending = DOCUMENT_SORT_OPTIONS[sort_label]
+    rows = sorted(rows, key=lambda r: r[sort_key] or "", reverse=descending)
+    
+    page_count = max(1, -(-len(rows) // page_size))
+    # Deletes or a new filter can shrink the table below the stored page
+    if st.session_state.get(f"doc_page_{project}", 1) > page_count:
+        st.session_state[f"doc_page_{project}"] = page_count
+    page = st.number_input(
+        f"페이지 (전체 {page_count}쪽, {len(rows)}개 문서)",
+        min_value=1, max_value=page_count, step=1,
+        key=f"doc_page_{project}"
+    )
+    page_rows = rows[(page - 1) * page_size:page * page_size]
+    
+    # Only the visible page is sent to the browser. The key includes the project version: Streamlit keeps a
+    # keyed table's selected row indices across reruns, and after a delete they would point at other documents
+    page_df = pd.DataFrame(page_rows).drop(columns=["generated_filename", "original_filename", "processed_at"])
+    selection = st.dataframe(
+        page_df,
+        hide_index=True,
+        width="stretch",
+        on_select="rerun",
+        selection_mode="multi-row",
+        key=f"doc_table_{project}_{version}_{page}_{sort_label}_{query}"
+    )
+    selected = [page_rows[i]["generated_filename"] for i in selection.selection.rows]
+    
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        if st.button(f"선택한 문서 삭제 ({len(selected)}개)", key=f"delete_selected_{project}",
+                     type="secondary", disabled=not selected):
+            deleted = delete_documents(project, selected)
+            if deleted == len(selected):
+                st.success(f"{deleted}개 문서가 삭제되었습니다!")
+            else:
+                st.error(f"일부 문서 삭제 실패! ({deleted}/{len(selected)}개 삭제)")
+            st.rerun()
+    with col2:
+        if st.button(f"'{project}' 프로젝트 전체 삭제", key=f"delete_project_{project}", type="secondary"):
+            if delete_entire_project(project):
+                st.success(f"'{project}' 프로젝트가 삭제되었습니다!")
+                st.rerun()
+            else:
+                st.error("프로젝트 삭제 실패!")
 
 
 # Main App
@@ -371,7 +387,7 @@ def main():
     st.title("TF Project Manager & Email Generator")
     
     # API Key warning for OpenAI only
-    if not openai.api_key or openai.api_key == "demo_key":
+    if is_demo_mode():
         st.warning("**데모 모드로 실행 중입니다.** 실제 LLM 기능을 사용하려면 .env 파일에 OPENAI_API_KEY를 설정해주세요.")
     
     st.markdown("---")
@@ -381,9 +397,18 @@ def main():
         st.header("Navigation")
         tab_selection = st.radio(
             "기능 선택:",
-            ["오프라인 미팅 기록 업로드", "담당자별 맞춤 요약", "TF명별 문서 현황"],
+            ["오프라인 미팅 기록 업로드", "담당자별 맞춤 요약", "TF명별 문서 현황", "Performance"],
             index=0  # 첫 번째 탭을 기본값으로 설정
         )
+        
+        st.markdown("---")
+        if st.session_state.pop("profile_request_taken", False):
+            st.session_state["profile_next_request"] = False
+        st.checkbox(
+            "다음 요청 프로파일링 (cProfile)",
+            key="profile_next_request",
+            help="다음 업로드/이메일 생성 요청 한 건에 대해 cProfile 결과를 수집합니다. 결과는 Performance 페이지에서 확인할 수 있습니다"
+        )
     
     if tab_selection == "오프라인 미팅 기록 업로드":
         st.header("오프라인 미팅 STT 기록 업로드")
@@ -424,6 +449,21 @@ def main():
                     help="영문, 숫자, 하이픈만 사용 가능"
                 )
             
+            # 진행 중인 미팅: 기존 문서에 이어서 추가
+            append_target = None
+            if tag_option == "기존 프로젝트 사용" and project_name in existing_tags:
+                if st.checkbox("진행 중인 미팅 기록에 이어서 추가", help="같은 미팅의 다음 구간이나 계속 늘어나는 STT 기록을 기존 문서에 반영합니다. 새로 추가된 부분만 요약되며, 문서의 기존 템플릿이 사용됩니다"):
+                    documents = load_document_rows(project_name, project_version(project_name))
+                    if documents:
+                        documents = sorted(documents, key=lambda r: r["processed_at"], reverse=True)
+                        append_target = st.selectbox(
+                            "이어서 추가할 문서",
+                            [r["generated_filename"] for r in documents],
+                            format_func=lambda name: next(f"{name} ({r['원본 파일명']})" for r in documents if r["generated_filename"] == name)
+                        )
+                    else:
+                        st.warning("이어서 추가할 문서가 없습니다.")
+            
             # 프로젝트 설명
             st.info("TF 프로젝트명은 관련된 미팅 기록들을 그룹화하는 데 사용됩니다. 같은 프로젝트의 모든 미팅 기록이 이메일 생성에 활용됩니다.")
             
@@ -467,12 +507,7 @@ def main():
             )
             
             if additional_prompt.strip():
-                template = f"""{base_template}
-
---- 추가 요청사항 ---
-{additional_prompt.strip()}
-
-위의 기본 템플릿 구조를 따르되, 추가 요청사항을 반영하여 더욱 상세하고 맞춤화된 내용으로 정리해주세요."""
+                template = build_custom_template(base_template, additional_prompt)
             else:
                 template = base_template
         else:
@@ -488,35 +523,95 @@ def main():
         else:
             upload_to_miso = False
         
+        # 유사도 임계값 (중복 업로드 감지)
+        similarity_threshold = st.slider(
+            "중복 감지 유사도 임계값",
+            min_value=0.5,
+            max_value=1.0,
+            value=DUPLICATE_SIMILARITY_THRESHOLD,
+            step=0.05,
+            help="기존 문서와 이 값 이상으로 유사한 업로드는 요약 전에 중복으로 표시됩니다"
+        )
+        
         if st.button("미팅 기록 정리 및 저장", type="primary", width="stretch"):
+            st.session_state.pop("pending_duplicate", None)
             if uploaded_file and project_name and template:
-                with st.spinner("미팅 기록을 처리중입니다..."):
+                with st.spinner("미팅 기록을 처리중입니다..."), \
+                        start_trace("upload", profile=take_profile_request(), project=project_name, file=uploaded_file.name):
                     # Read file content using the new function
                     content = read_file_content(uploaded_file)
                     
-                    # Process with LLM
-                    processed_content = process_with_llm(content, template)
-                    
-                    # Save to project folder
-                    saved_path, generated_filename = save_project_file(
-                        project_name, 
-                        uploaded_file.name, 
-                        processed_content, 
-                        template
-                    )
-                    
-                    # Show success message for local save
-                    st.success(f"✅ '{project_name}' 프로젝트에 저장 완료")
-                    
-                    # MISO API 업로드 (조용히 실행)
-                    if upload_to_miso:
-                        miso_result = upload_to_miso_api(generated_filename, processed_content)
-                    
-                    # Show processed content
-                    with st.expander("정리된 미팅 기록 미리보기"):
-                        st.markdown(processed_content)
+                    duplicates = []
+                    if content.startswith((UPLOAD_TOO_LARGE_PREFIX, MEMORY_BUDGET_PREFIX)):
+                        st.error(content)
+                    elif append_target:
+                        # The ongoing meeting's document is known; no duplicate check needed
+                        summarize_and_append(project_name, append_target, uploaded_file.name, content, template, upload_to_miso)
+                    else:
+                        # Check for near-duplicates before spending an LLM call
+                        signature = compute_signature(content)
+                        duplicates = find_near_duplicates(DATA_DIR / project_name, signature, similarity_threshold)
+                        unsigned = missing_signatures(DATA_DIR / project_name, list_document_ids(project_name))
+                        if unsigned:
+                            st.caption(f"기존 문서 {len(unsigned)}개는 유사도 서명이 없어 중복 검사에서 제외되었습니다 "
+                                       "(중복 검사 도입 이전에 저장되었거나 서명 없이 가져온 문서)")
+                        
+                        if not duplicates:
+                            summarize_and_save(project_name, uploaded_file.name, content, template, signature, upload_to_miso)
+                
+                if duplicates:
+                    st.session_state["pending_duplicate"] = {
+                        "project_name": project_name,
+                        "filename": uploaded_file.name,
+                        "content": content,
+                        "template": template,
+                        "signature": signature,
+                        "duplicates": duplicates
+                    }
             else:
                 st.error("모든 필드를 입력해주세요.")
+        
+        # 중복 의심 업로드 처리 방식 선택
+        pending = st.session_state.get("pending_duplicate")
+        if pending:
+            st.warning(f"'{pending['filename']}' 파일이 '{pending['project_name']}' 프로젝트의 기존 문서와 매우 유사합니다.")
+            st.dataframe(
+                pd.DataFrame([
+                    {"기존 문서": d["document_key"], "원본 파일명": d["original_filename"], "유사도": f"{d['similarity']:.0%}"}
+                    for d in pending["duplicates"]
+                ]),
+                width="stretch",
+                hide_index=True
+            )
+            duplicate_action = st.radio(
+                "처리 방식:",
+                ["건너뛰기", "기존 문서 교체", "연결하여 저장", "기존 문서에 이어서 추가"],
+                horizontal=True,
+                help="건너뛰기: 요약하지 않습니다 / 기존 문서 교체: 유사한 기존 문서를 삭제하고 새로 저장합니다 / 연결하여 저장: 중복으로 표시해 저장하며 이메일 생성 시 한 번만 반영됩니다 / 기존 문서에 이어서 추가: 가장 유사한 문서에 새로 추가된 부분만 요약해 반영합니다"
+            )
+            if st.button("선택한 방식으로 진행", type="primary"):
+                st.session_state.pop("pending_duplicate")
+                if duplicate_action == "건너뛰기":
+                    st.info("중복 업로드를 건너뛰었습니다.")
+                else:
+                    duplicate_keys = [d["document_key"] for d in pending["duplicates"]]
+                    with st.spinner("미팅 기록을 처리중입니다..."), \
+                            start_trace("upload", profile=take_profile_request(), project=pending["project_name"], file=pending["filename"]):
+                        if duplicate_action == "기존 문서에 이어서 추가":
+                            summarize_and_append(
+                                pending["project_name"], duplicate_keys[0], pending["filename"], pending["content"],
+                                pending["template"], upload_to_miso
+                            )
+                        elif duplicate_action == "기존 문서 교체":
+                            summarize_and_save(
+                                pending["project_name"], pending["filename"], pending["content"], pending["template"],
+                                pending["signature"], upload_to_miso, replace_documents=duplicate_keys
+                            )
+                        else:
+                            summarize_and_save(
+                                pending["project_name"], pending["filename"], pending["content"], pending["template"],
+                                pending["signature"], upload_to_miso, {"duplicate_of": duplicate_keys}
+                            )
     
     elif tab_selection == "담당자별 맞춤 요약":
         st.header("담당자별 맞춤 미팅 요약 이메일")
@@ -537,19 +632,24 @@ def main():
                 )
                 
                 if selected_project:
-                    project_files = get_project_files(selected_project)
-                    st.info(f"{len(project_files)}개의 문서가 이 TF 프로젝트에 저장되어 있습니다")
+                    # 받는 사람 정보를 입력하는 동안 문서 로딩과 인덱싱을 백그라운드에서 미리 진행
+                    prefetch_future = prefetch(selected_project)
+                    project_summary = get_project_summary(selected_project)
+                    st.info(f"{project_summary['document_count']}개의 문서가 이 TF 프로젝트에 저장되어 있습니다")
                     
                     # TF명별 요약 정보 표시
                     with st.expander(f"'{selected_project}' TF 프로젝트 요약"):
-                        if project_files:
+                        if not prefetch_future.done():
+                            st.caption("문서를 미리 불러오는 중입니다...")
+                        elif prefetch_future.exception() is None and prefetch_future.result()["documents"]:
+                            project_files = prefetch_future.result()["documents"]
                             latest_files = sorted(project_files, key=lambda x: x.get('processed_at', ''), reverse=True)[:3]
                             st.write("**최근 문서 3개:**")
                             for i, file_info in enumerate(latest_files, 1):
                                 st.write(f"{i}. {file_info.get('original_filename', 'Unknown')} - {file_info.get('processed_at', 'Unknown')[:10]}")
                         
                         # 태그 통계
-                        total_docs = len(project_files)
+                        total_docs = project_summary["document_count"]
                         st.metric("총 문서 수", total_docs)
         
                         with col2:
@@ -571,7 +671,7 @@ def main():
                                 horizontal=True
                             )
                             
-                            default_orgs = ["사업개발", "제품팀", "마케팅", "기획", "개발", "디자인", "경영지원"]
+                            default_orgs = DEFAULT_ORGANIZATIONS
                             
                             if organization_option == "기본 조직 선택":
                                 organization = st.selectbox(
@@ -613,6 +713,22 @@ def main():
                                 height=80,
                                 help="받는 사람의 직책, 보고라인, 주요 업무, 복수 조직 소속 여부 등을 설명해주세요"
                             )
+                            
+                            # 4. 발송 범위 (받는 사람별 발송 기록 기준)
+                            st.write("**4. 발송 범위**")
+                            last_send = get_last_send(selected_project, person_name) if person_name else None
+                            if last_send:
+                                email_scope = st.radio(
+                                    "요약할 미팅 기록",
+                                    EMAIL_SCOPES,
+                                    horizontal=True,
+                                    help="변경분만 선택하면 마지막 발송 이후 새로 저장되거나 이어서 추가된 문서만 요약합니다"
+                                )
+                                st.caption(f"마지막 발송: {last_send['sent_at'][:16].replace('T', ' ')} "
+                                           f"(문서 {last_send['document_count']}개 요약)")
+                            else:
+                                email_scope = EMAIL_SCOPES[1]
+                                st.caption("이 받는 사람에게 보낸 기록이 없어 전체 미팅 기록으로 작성합니다")
         
         # Channel.io 전송 옵션
         st.subheader("📱 채널 방 자동 전송")
@@ -637,58 +753,134 @@ def main():
             if missing_fields:
                 st.error(f"다음 필드를 입력해주세요: {', '.join(missing_fields)}")
             else:
-                project_files = get_project_files(selected_project)
+                with start_trace("email", profile=take_profile_request(), project=selected_project):
+                    # 받는 사람이 이전에 받은 범위 이후의 문서만 읽음 (커서는 읽기 전에 잡아 누락 방지)
+                    delta = email_scope == EMAIL_SCOPES[0] and last_send is not None
+                    combined_content = None
+                    prefetch_info = None
+                    if delta:
+                        cursor = document_cursor(selected_project)
+                        project_files = get_project_files_since(selected_project, last_send["cursor"])
+                    else:
+                        # TF 선택 시 미리 준비해 둔 문서와 결합 내용을 사용 (그 사이 변경되었으면 다시 준비)
+                        context, prefetch_info = get_context(selected_project)
+                        cursor = context["cursor"]
+                        project_files = context["documents"]
+                        combined_content = context["combined_content"]
                 
-                if project_files:
-                    # 3개 카테고리 정보 구성
-                    context_info = {
-                        # 1. 주제 (미팅이 소속된 프로젝트명)
-                        "meeting_subject": meeting_subject,
-                        # 2. 조직 (담당자의 소속 조직)
-                        "organization": organization,
-                        "org_role_description": org_role_description,
-                        # 3. 담당자 (이름과 역할 설명)
-                        "person_name": person_name,
-                        "person_role": person_role
-                    }
+                    if project_files:
+                        # 3개 카테고리 정보 구성
+                        context_info = {
+                            # 1. 주제 (미팅이 소속된 프로젝트명)
+                            "meeting_subject": meeting_subject,
+                            # 2. 조직 (담당자의 소속 조직)
+                            "organization": organization,
+                            "org_role_description": org_role_description,
+                            # 3. 담당자 (이름과 역할 설명)
+                            "person_name": person_name,
+                            "person_role": person_role
+                        }
                     
-                    with st.spinner(f"{person_name}({organization})님을 위한 '{selected_project}' TF 프로젝트 맞춤 요약을 생성중입니다..."):
-                        email_content = generate_role_based_email(
-                            selected_project, 
-                            context_info, 
-                            project_files
+                        # 저장 시 추출해 둔 결정 사항과 받는 사람의 액션 아이템만 프롬프트에 사용
+                        recipient_items = query_items(
+                            selected_project, person=person_name, organization=organization,
+                            document_ids={f.get("generated_filename") for f in project_files} if delta else None
                         )
+                        structured_content = format_for_prompt(recipient_items) if recipient_items["action_items"] else None
+                        
+                        with llm_queue_feedback(selected_project), \
+                                st.spinner(f"{person_name}({organization})님을 위한 '{selected_project}' TF 프로젝트 맞춤 요약을 생성중입니다..."):
+                            email_content = generate_role_based_email(
+                                selected_project, 
+                                context_info, 
+                                project_files,
+                                structured_content=structured_content,
+                                last_sent_at=last_send["sent_at"][:16].replace("T", " ") if delta else None,
+                                combined_content=combined_content
+                            )
                         
-                        st.success("맞춤 요약 이메일이 성공적으로 생성되었습니다!")
+                            if email_content.startswith(EMAIL_ERROR_PREFIX):
+                                st.error(email_content)
+                            else:
+                                st.success("맞춤 요약 이메일이 성공적으로 생성되었습니다!")
+                                if delta:
+                                    st.caption(f"지난 발송 이후 새로 추가되거나 변경된 문서 {len(project_files)}개만 요약했습니다")
+                                elif prefetch_info["hit"]:
+                                    st.caption(f"TF 선택 시 미리 준비한 문서 {len(project_files)}개를 사용해 "
+                                               f"{prefetch_info['saved_ms']:,.0f} ms를 절약했습니다 (예상 입력 토큰 약 {context['estimated_tokens']:,}개)")
                         
-                        # Send to Channel.io if option is enabled
-                        if send_to_channel_option:
-                            with st.spinner("채널 방에 전송 중..."):
-                                channel_result = send_to_channel(email_content, person_name, selected_project)
-                                if channel_result["success"]:
-                                    st.success(f"📱 {channel_result['message']}")
-                                else:
-                                    st.warning(f"⚠️ {channel_result['message']}")
+                                # Send to Channel.io if option is enabled
+                                if send_to_channel_option:
+                                    with st.spinner("채널 방에 전송 중..."):
+                                        channel_result = send_to_channel(email_content, person_name, selected_project)
+                                        if channel_result["success"]:
+                                            st.success(f"📱 {channel_result['message']}")
+                                        else:
+                                            st.warning(f"⚠️ {channel_result['message']}")
+                                        if len(channel_result["rooms"]) > 1 or (channel_result["rooms"] and not channel_result["success"]):
+                                            st.dataframe(
+                                                pd.DataFrame([
+                                                    {
+                                                        "채널 방": r["room"],
+                                                        "결과": "성공" if r["success"] else "실패",
+                                                        "전송 메시지": f"{r['sent_chunks']}/{r['total_chunks']}",
+                                                        "시도 횟수": r["attempts"],
+                                                        "상세": r["message"]
+                                                    }
+                                                    for r in channel_result["rooms"]
+                                                ]),
+                                                width="stretch",
+                                                hide_index=True
+                                            )
                         
-                        # Display email
-                        st.subheader(f"{person_name}({organization})님을 위한 '{selected_project}' TF 프로젝트 맞춤 요약")
-                        st.markdown("---")
-                        st.markdown(email_content)
+                                # 실제로 전달된 이메일만 발송 기록에 남김: 채널 전송 실패나 데모 출력을 기록하면
+                                # 다음 '변경분' 이메일에서 받는 사람이 받지 못한 내용이 빠짐
+                                if not is_demo_mode() and (not send_to_channel_option or channel_result["success"]):
+                                    record_send(
+                                        selected_project, person_name, cursor, organization,
+                                        mode="delta" if delta else "full", document_count=len(project_files)
+                                    )
                         
-                        # Copy to clipboard section
-                        st.markdown("---")
-                        st.write("**📋 복사용 텍스트:**")
-                        with st.expander("클릭하여 복사용 텍스트 보기"):
-                            st.text_area(
-                                "이메일 내용 (복사용)",
-                                value=email_content,
-                                height=300,
-                                help="이 텍스트를 복사해서 이메일로 사용하세요"
-                            )
-                else:
-                    st.error("선택한 TF 프로젝트에 문서가 없습니다.")
+                                if structured_content:
+                                    st.caption(f"사전 추출된 액션 아이템 {len(recipient_items['action_items'])}개와 결정 사항 {len(recipient_items['decisions'])}개를 바탕으로 작성되었습니다")
+                                    with st.expander("받는 사람의 액션 아이템"):
+                                        st.dataframe(
+                                            pd.DataFrame([
+                                                {
+                                                    "할 일": item["task"],
+                                                    "담당": item["owner"] or "",
+                                                    "조직": item["organization"] or "",
+                                                    "마감일": item["due_date"] or "",
+                                                    "우선순위": item["priority"] or "",
+                                                    "문서": item["document_id"]
+                                                }
+                                                for item in recipient_items["action_items"]
+                                            ]),
+                                            width="stretch",
+                                            hide_index=True
+                                        )
+                            
+                                # Display email
+                                st.subheader(f"{person_name}({organization})님을 위한 '{selected_project}' TF 프로젝트 맞춤 요약")
+                                st.markdown("---")
+                                st.markdown(email_content)
+                        
+                                # Copy to clipboard section
+                                st.markdown("---")
+                                st.write("**📋 복사용 텍스트:**")
+                                with st.expander("클릭하여 복사용 텍스트 보기"):
+                                    st.text_area(
+                                        "이메일 내용 (복사용)",
+                                        value=email_content,
+                                        height=300,
+                                        help="이 텍스트를 복사해서 이메일로 사용하세요"
+                                    )
+                    elif delta:
+                        st.info(f"{person_name}님에게 마지막으로 보낸 이후 새로 추가되거나 변경된 미팅 기록이 없습니다.")
+                    else:
+                        st.error("선택한 TF 프로젝트에 문서가 없습니다.")
     
-    else:  # TF명 현황
+    elif tab_selection == "TF명별 문서 현황":
         st.header("TF명별 문서 현황")
         
         tags = get_all_projects()
@@ -709,19 +901,9 @@ def main():
                     st.success("모든 데이터가 초기화되었습니다!")
                     st.rerun()
             
-            # TF명별 통계 요약
-            total_docs = 0
-            project_stats = []
-            for project in tags:
-                files = get_project_files(project)
-                doc_count = len(files)
-                total_docs += doc_count
-                latest_date = max([f.get('processed_at', '2000-01-01') for f in files]) if files else '없음'
-                project_stats.append({
-                    "TF 프로젝트": project,
-                    "문서 수": doc_count,
-                    "최근 업데이트": latest_date[:10] if latest_date != '없음' else '없음'
-                })
+            # TF명별 통계 요약 (문서 내용은 읽지 않음)
+            summaries = {project: get_project_summary(project) for project in tags}
+            total_docs = sum(summary["document_count"] for summary in summaries.values())
             
             # 전체 통계
             col1, col2, col3 = st.columns(3)
@@ -733,7 +915,7 @@ def main():
                 avg_docs = total_docs / len(tags) if tags else 0
                 st.metric("프로젝트당 평균 문서", f"{avg_docs:.1f}개")
             
-            # TF명별 상세 정보 - 표 형식으로 복원
+            # TF명별 상세 정보 - 프로젝트당 하나의 표
             st.subheader("TF명별 상세 현황")
             
             # 전체 삭제 버튼을 위한 공간
@@ -746,57 +928,110 @@ def main():
                     st.rerun()
             
             for project in tags:
-                with st.expander(f"TF 프로젝트: {project}"):
-                    files = get_project_files(project)
-                    
-                    if files:
-                        st.write(f"**문서 수**: {len(files)}개")
-                        
-                        # 표 형식으로 파일 목록 표시
-                        file_data = []
-                        for i, file_info in enumerate(files):
-                            sync_info = f"sync_{file_info.get('sync_number', 'N/A')}" if file_info.get('sync_number') else "Legacy"
-                            date_info = file_info.get('date', file_info.get('processed_at', 'Unknown')[:10])
-                            file_data.append({
-                                "파일명": f"{date_info}_{sync_info}",
-                                "원본 파일명": file_info.get("original_filename", "Unknown"),
-                                "처리일시": file_info.get("processed_at", "Unknown")[:19].replace("T", " "),
-                                "템플릿 사용": "사용함" if file_info.get("template_used") else "미사용",
-                                "삭제": f"delete_file_{project}_{i}"
-                            })
-                        
-                        if file_data:
-                            # 삭제 버튼들을 위한 행
-                            for i, row in enumerate(file_data):
-                                col1, col2, col3, col4, col5 = st.columns([2, 2, 2, 1, 1])
-                                with col1:
-                                    st.write(row["파일명"])
-                                with col2:
-                                    st.write(row["원본 파일명"])
-                                with col3:
-                                    st.write(row["처리일시"])
-                                with col4:
-                                    st.write(row["템플릿 사용"])
-                                with col5:
-                                    if st.button("삭제", key=f"delete_file_{project}_{i}", type="secondary"):
-                                        if delete_project_file(project, i):
-                                            st.success("파일이 삭제되었습니다!")
-                                            st.rerun()
-                                        else:
-                                            st.error("삭제 실패!")
-                            
-                            # 프로젝트 전체 삭제 버튼
-                            st.markdown("---")
-                            if st.button(f"'{project}' 프로젝트 전체 삭제", key=f"delete_project_{project}", type="secondary"):
-                                if delete_entire_project(project):
-                                    st.success(f"'{project}' 프로젝트가 삭제되었습니다!")
-                                    st.rerun()
-                                else:
-                                    st.error("프로젝트 삭제 실패!")
-                        
-                    else:
-                        st.warning("문서가 없습니다.")
+                summary = summaries[project]
+                label = f"TF 프로젝트: {project} ({summary['document_count']}개 문서, 최근 업데이트: {summary['latest_date'] or '없음'})"
+                expander_key = f"project_expander_{project}"
+                # The label is part of the widget's identity, so a delete (new count) would collapse it otherwise
+                expander = st.expander(label, expanded=st.session_state.get(expander_key, False),
+                                       key=expander_key, on_change="rerun")
+                # Documents are only loaded for expanded projects
+                if expander.open:
+                    with expander:
+                        render_document_table(project)
 
+    else:  # Performance
+        st.header("Performance")
+        
+        # LLM 토큰 예산 (앱과 watch daemon이 같은 예산을 공유)
+        budget = get_scheduler().snapshot()
+        st.subheader(f"LLM 토큰 예산 (최근 {budget['window_seconds']:.0f}초)")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("사용 토큰", f"{budget['used_tokens']:,} / {budget['tokens_per_window']:,}",
+                      help=f"배치 작업은 {budget['batch_tokens_per_window']:,} 토큰까지만 사용합니다")
+        with col2:
+            st.metric("실행 중인 LLM 요청", f"{budget['running']} / {budget['max_concurrency']}")
+        with col3:
+            average_wait = budget["wait_seconds"] / budget["waited_jobs"] if budget["waited_jobs"] else 0
+            st.metric("대기 중인 LLM 요청", len(budget["waiting"]),
+                      help=f"대기 후 실행 {budget['waited_jobs']}건 (평균 {average_wait:.1f}초), 거절 {budget['rejected']}건")
+        if budget["by_project"]:
+            st.dataframe(
+                pd.DataFrame([
+                    {"프로젝트": project or "(미지정)", "사용 토큰": tokens, "프로젝트 한도": budget["project_tokens_per_window"]}
+                    for project, tokens in sorted(budget["by_project"].items(), key=lambda kv: -kv[1])
+                ]),
+                width="stretch",
+                hide_index=True
+            )
+        
+        # 이메일 컨텍스트 사전 준비 효과
+        st.subheader("이메일 컨텍스트 사전 준비")
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("사전 준비 사용", f"{prefetch_stats['hits']}건", help=f"사용하지 못하고 새로 준비 {prefetch_stats['misses']}건")
+        with col2:
+            st.metric("절약한 대기 시간", f"{prefetch_stats['saved_ms']:,.0f} ms")
+        with col3:
+            average_saved = prefetch_stats["saved_ms"] / prefetch_stats["hits"] if prefetch_stats["hits"] else 0
+            st.metric("요청당 평균 절약", f"{average_saved:,.0f} ms",
+                      help=f"준비가 끝나기를 기다린 시간 합계 {prefetch_stats['waited_ms']:,.0f} ms")
+        
+        traces = get_recent_traces()
+        
+        if not traces:
+            st.info("아직 수집된 트레이스가 없습니다. 미팅 기록 업로드나 이메일 생성 요청을 실행하면 단계별 소요 시간이 기록됩니다.")
+        else:
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                st.subheader(f"최근 요청 {len(traces)}건")
+            with col2:
+                if st.button("트레이스 초기화", type="secondary"):
+                    clear_traces()
+                    st.rerun()
+            
+            # 단계별 집계 (가장 느린 단계 순)
+            st.subheader("단계별 소요 시간 집계")
+            span_stats = aggregate_spans(traces)
+            if span_stats:
+                st.dataframe(pd.DataFrame(span_stats), width="stretch", hide_index=True)
+            
+            # 요청별 워터폴
+            st.subheader("요청별 워터폴")
+            trace_labels = {
+                f"{t['started_at'][:19].replace('T', ' ')} | {t['name']} | {t['duration_ms']:.0f} ms | {t['trace_id']}": t
+                for t in traces
+            }
+            selected_label = st.selectbox("트레이스 선택", list(trace_labels.keys()))
+            selected_trace = trace_labels[selected_label]
+            
+            if selected_trace["attrs"]:
+                st.caption(", ".join(f"{k}: {v}" for k, v in selected_trace["attrs"].items()))
+            if selected_trace["error"]:
+                st.error(selected_trace["error"])
+            
+            waterfall = pd.DataFrame(flatten_trace(selected_trace))
+            waterfall["order"] = range(len(waterfall))
+            # One row per span: rows are keyed by row_key, and the axis shows only the (indented) name
+            chart = alt.Chart(waterfall).mark_bar().encode(
+                x=alt.X("start_ms:Q", title="ms"),
+                x2="end_ms:Q",
+                y=alt.Y("row_key:N", sort=alt.EncodingSortField(field="order"), title=None,
+                        axis=alt.Axis(labelExpr="split(datum.value, '|')[1]")),
+                color=alt.Color("depth:O", legend=None),
+                tooltip=[alt.Tooltip("span", title="name"), "path", "start_ms", "duration_ms", "error"]
+            )
+            st.altair_chart(chart, width="stretch")
+            st.dataframe(
+                waterfall[["path", "start_ms", "duration_ms", "error"]],
+                width="stretch",
+                hide_index=True
+            )
+            
+            if selected_trace.get("profile"):
+                with st.expander("cProfile 결과"):
+                    st.code(selected_trace["profile"])
+    
     # Footer
     st.markdown("---")
     st.markdown("**TF Project Manager** | Made with Streamlit")
@@ -0,0 +1,89 @@
+"""
+Cross-process locking and atomic replacement of shared state files
+
+The app, the watch daemon and the CLI tools are separate processes writing
+the same JSON state files (template registry, MinHash index, action item
+index, send ledger, segment index). Every read-modify-write of such a file
+runs under `dir_lock` of the folder holding it, and the new content is
+written through a uniquely named temp file that replaces the target in one
+step, so concurrent writers neither clobber each other's temp file nor lose
+each other's entries.
+"""
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locking
+    fcntl = None
+
+LOCK_FILENAME = ".lock"
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+_held_locks = threading.local()
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Exclusive lock on `lock_path` across threads and processes; re-entrant within a thread"""
+    key = Path(lock_path).resolve()
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(key, threading.RLock())
+    with thread_lock:
+        held = _held_locks.__dict__.setdefault("paths", set())
+        # Re-entered by the thread that holds it: a second flock through a new
+        # file descriptor would wait on our own lock forever
+        if fcntl is None or key in held:
+            yield
+            return
+        held.add(key)
+        try:
+            with open(key, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            held.discard(key)
+
+
+def dir_lock(directory):
+    """Lock guarding the state files of a folder (a project, or the data folder itself)"""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    return file_lock(directory / LOCK_FILENAME)
+
+
+def atomic_write(path, data, fsync=False):
+    """Replace `path` with `data` (str or bytes) through a uniquely named temp file"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    mode, encoding = ('w', 'utf-8') if isinstance(data, str) else ('wb', None)
+    with tempfile.NamedTemporaryFile(mode, encoding=encoding, dir=path.parent, prefix=f".{path.name}.",
+                                     suffix=".partial", delete=False) as f:
+        tmp_path = f.name
+        try:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            f.close()
+            os.unlink(tmp_path)
+            raise
+    try:
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def atomic_write_json(path, obj, indent=None, fsync=False):
+    """Replace `path` with `obj` as JSON (non-ASCII kept as is)"""
+    atomic_write(path, json.dumps(obj, ensure_ascii=False, indent=indent), fsync=fsync)
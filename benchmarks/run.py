@@ -0,0 +1,278 @@
+"""Storage and extraction micro-benchmarks
+
+Usage (from the repository root):
+    python -m benchmarks.run run --projects 5,50 --docs 10,200 --content-kb 2,8
+    python -m benchmarks.run run --docx-kb 1024,8192 --repeat 3
+    python -m benchmarks.run compare benchmarks/results/old.json benchmarks/results/new.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+# Keep the benchmark away from the real data directory
+os.environ.setdefault("TF_DATA_DIR", tempfile.mkdtemp(prefix="tf_bench_"))
+# save_project_file extracts action items with the LLM; measure storage, not the API
+# (load_dotenv does not override a variable that is already set)
+os.environ["OPENAI_API_KEY"] = "demo_key"
+
+import docx
+
+import storage
+from compaction import compact_project
+from docx_stream import extract_docx_text
+from file_reader import read_file_content
+from template_registry import migrate_documents
+from templates import get_predefined_templates
+from benchmarks.synthetic import generate_project_tree, make_docx_bytes, make_text, make_upload
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def time_call(func, repeat, setup=None):
+    """Run func `repeat` times and return timing stats in milliseconds"""
+    durations = []
+    for _ in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        func(*args)
+        durations.append((time.perf_counter() - start) * 1000)
+    return {
+        "repeat": repeat,
+        "min_ms": round(min(durations), 3),
+        "median_ms": round(statistics.median(durations), 3),
+        "mean_ms": round(statistics.mean(durations), 3),
+        "max_ms": round(max(durations), 3)
+    }
+
+
+def bench_storage(num_projects, docs_per_project, content_kb, repeat, legacy_templates=False):
+    """Time the storage accessors on a synthetic tree of the given size"""
+    root = Path(tempfile.mkdtemp(prefix="tf_bench_tree_"))
+    storage.DATA_DIR = root
+    try:
+        projects = generate_project_tree(
+            root, num_projects, docs_per_project, content_kb * 1024, legacy_templates=legacy_templates
+        )
+        target = projects[0]
+        template = next(iter(get_predefined_templates().values()))
+        content = make_text(content_kb * 1024, random.Random(1))
+        params = {
+            "projects": num_projects,
+            "docs": docs_per_project,
+            "content_kb": content_kb,
+            "legacy_templates": legacy_templates
+        }
+
+        results = []
+
+        def add(name, stats):
+            results.append({"benchmark": name, "params": params, **stats})
+
+        add("get_all_projects", time_call(storage.get_all_projects, repeat))
+        add("get_project_files", time_call(lambda: storage.get_project_files(target), repeat))
+        add("get_project_files_all_projects", time_call(
+            lambda: [storage.get_project_files(p) for p in storage.get_all_projects()], repeat
+        ))
+        if len(projects) > 1:
+            compacted = projects[1]
+            add("compact_project", time_call(lambda: compact_project(root / compacted, min_age_days=0), 1))
+            add("get_project_files_compacted", time_call(lambda: storage.get_project_files(compacted), repeat))
+        saved = []
+        add("save_project_file", time_call(
+            lambda: saved.append(storage.save_project_file(target, "bench.txt", content, template)[1]), repeat
+        ))
+        add("delete_document", time_call(
+            lambda generated_filename: storage.delete_document(target, generated_filename), repeat,
+            setup=lambda: (saved.pop(),)
+        ))
+
+        # Each run deletes a freshly generated project of the same shape
+        scratch_counter = iter(range(repeat))
+
+        def make_scratch():
+            prefix = f"Delete-{next(scratch_counter)}"
+            return tuple(generate_project_tree(
+                root, 1, docs_per_project, content_kb * 1024, prefix=prefix, legacy_templates=legacy_templates
+            ))
+
+        add("delete_entire_project", time_call(storage.delete_entire_project, repeat, setup=make_scratch))
+
+        if legacy_templates:
+            add("migrate_documents", time_call(lambda: migrate_documents(root), 1))
+        return results
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def bench_read_file_content(kinds, sizes_kb, repeat):
+    """Time read_file_content on synthetic uploads of each kind and size"""
+    results = []
+    for kind in kinds:
+        for size_kb in sizes_kb:
+            data = make_upload(kind, size_kb * 1024)
+
+            def rewind():
+                data.seek(0)
+                return (data,)
+
+            stats = time_call(read_file_content, repeat, setup=rewind)
+            results.append({
+                "benchmark": f"read_file_content[{kind}]",
+                "params": {"kind": kind, "size_kb": size_kb, "file_bytes": data.size},
+                **stats
+            })
+    return results
+
+
+def peak_memory_kb(func, *args):
+    """Peak Python heap allocation of one call, in KB (measured separately from timing)"""
+    tracemalloc.start()
+    try:
+        func(*args)
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def _python_docx_text(file_obj):
+    document = docx.Document(file_obj)
+    return "\n".join(paragraph.text for paragraph in document.paragraphs)
+
+
+DOCX_ENGINES = {
+    "stream": extract_docx_text,
+    "python-docx": _python_docx_text
+}
+
+
+def bench_docx_engines(sizes_kb, repeat):
+    """Time and measure peak memory of each DOCX extraction engine on large documents"""
+    results = []
+    for size_kb in sizes_kb:
+        data = make_docx_bytes(size_kb * 1024)
+        for engine, extract in DOCX_ENGINES.items():
+            stats = time_call(extract, repeat, setup=lambda: (io.BytesIO(data),))
+            results.append({
+                "benchmark": f"docx_extract[{engine}]",
+                "params": {"engine": engine, "size_kb": size_kb, "file_bytes": len(data)},
+                **stats,
+                "peak_kb": peak_memory_kb(extract, io.BytesIO(data))
+            })
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def run(args):
+    results = []
+    for num_projects in args.projects:
+        for docs in args.docs:
+            for content_kb in args.content_kb:
+                print(f"storage: projects={num_projects} docs={docs} content_kb={content_kb}", file=sys.stderr)
+                results.extend(bench_storage(num_projects, docs, content_kb, args.repeat, args.legacy_templates))
+
+    print(f"read_file_content: kinds={args.kinds} sizes_kb={args.file_kb}", file=sys.stderr)
+    results.extend(bench_read_file_content(args.kinds.split(","), args.file_kb, args.repeat))
+
+    if args.docx_kb:
+        print(f"docx engines: sizes_kb={args.docx_kb}", file=sys.stderr)
+        results.extend(bench_docx_engines(args.docx_kb, args.repeat))
+
+    report = {
+        "created_at": datetime.now().isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "label": args.label,
+        "results": results
+    }
+
+    output = Path(args.output) if args.output else RESULTS_DIR / (
+        f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{report['git_revision'] or 'local'}.json"
+    )
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    for row in results:
+        peak = f"  peak {row['peak_kb']:>10.1f} KB" if "peak_kb" in row else ""
+        print(f"{row['benchmark']:<36} {json.dumps(row['params'], ensure_ascii=False):<60} median {row['median_ms']:>10.3f} ms{peak}")
+    print(f"\nResults written to {output}")
+
+
+def _result_key(row):
+    return f"{row['benchmark']} {json.dumps(row['params'], sort_keys=True, ensure_ascii=False)}"
+
+
+def compare(args):
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = {_result_key(r): r for r in json.load(f)["results"]}
+    with open(args.candidate, encoding='utf-8') as f:
+        candidate = {_result_key(r): r for r in json.load(f)["results"]}
+
+    print(f"{'benchmark':<100} {'baseline':>12} {'candidate':>12} {'ratio':>8}")
+    for key, row in candidate.items():
+        if key not in baseline:
+            print(f"{key:<100} {'-':>12} {row['median_ms']:>12.3f} {'new':>8}")
+            continue
+        before = baseline[key]["median_ms"]
+        after = row["median_ms"]
+        ratio = after / before if before else float("inf")
+        flag = "  <-- slower" if ratio > 1 + args.threshold else ""
+        print(f"{key:<100} {before:>12.3f} {after:>12.3f} {ratio:>7.2f}x{flag}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Storage and extraction micro-benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmark suite")
+    run_parser.add_argument("--projects", type=_int_list, default=[5, 50], help="Comma-separated project counts")
+    run_parser.add_argument("--docs", type=_int_list, default=[10, 100], help="Comma-separated documents per project")
+    run_parser.add_argument("--content-kb", type=_int_list, default=[2, 8], help="Comma-separated document content sizes (KB)")
+    run_parser.add_argument("--kinds", default="txt,pdf,docx", help="Comma-separated upload kinds for read_file_content")
+    run_parser.add_argument("--file-kb", type=_int_list, default=[16, 256], help="Comma-separated upload text sizes (KB)")
+    run_parser.add_argument("--docx-kb", type=_int_list, default=[1024],
+                            help="Comma-separated DOCX text sizes (KB) for the engine comparison (empty to skip)")
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--legacy-templates", action="store_true",
+                            help="Embed full template text in documents (pre-registry layout) and time the migration")
+    run_parser.add_argument("--label", default="", help="Free-form label stored with the results")
+    run_parser.add_argument("--output", help="Result file path (default: benchmarks/results/<timestamp>_<rev>.json)")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two result files")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown to flag (default 0.1)")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
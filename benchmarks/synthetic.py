@@ -0,0 +1,179 @@
+import io
+import json
+import random
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import docx
+
+from template_registry import register_template
+from templates import get_predefined_templates
+
+# Word pool used to build meeting-like filler text
+WORDS = [
+    "미팅", "프로젝트", "일정", "검토", "담당자", "마감일", "우선순위", "결정", "액션", "아이템",
+    "사업개발", "제품팀", "마케팅", "기획", "개발", "디자인", "리스크", "예산", "고객사", "파트너십",
+    "진행", "완료", "공유", "논의", "후속", "보고", "요청", "확인", "지원", "전략"
+]
+ASCII_WORDS = [
+    "meeting", "project", "schedule", "review", "owner", "deadline", "priority", "decision",
+    "action", "item", "partner", "budget", "risk", "customer", "launch", "follow-up", "report"
+]
+
+
+def make_text(size_bytes, rng, words=WORDS):
+    """Build filler text of roughly size_bytes (UTF-8) split into short lines"""
+    parts = []
+    total = 0
+    line_len = 0
+    while total < size_bytes:
+        word = rng.choice(words)
+        parts.append(word)
+        encoded = len(word.encode("utf-8")) + 1
+        total += encoded
+        line_len += encoded
+        if line_len > 80:
+            parts.append("\n")
+            line_len = 0
+        else:
+            parts.append(" ")
+    return "".join(parts)
+
+
+def make_document(project_name, sync_number, content_size, rng, template_field, processed_at):
+    """Build a document dict in the same layout save_project_file writes"""
+    date = processed_at.strftime('%Y%m%d')
+    generated_filename = f"{date}_sync_{sync_number}"
+    return {
+        "original_filename": f"meeting_{sync_number}.txt",
+        **template_field,
+        "processed_at": processed_at.isoformat(),
+        "content": make_text(content_size, rng),
+        "sync_number": sync_number,
+        "date": date,
+        "generated_filename": generated_filename
+    }
+
+
+def generate_project_tree(root, num_projects, docs_per_project, content_size, seed=0, prefix="Synthetic-TF",
+                          legacy_templates=False):
+    """Create a synthetic tf_projects tree of num_projects x docs_per_project documents
+
+    With legacy_templates=True documents embed the full template text (pre-registry layout).
+    """
+    rng = random.Random(seed)
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    if legacy_templates:
+        templates = [{"template_used": text} for text in get_predefined_templates().values()]
+    else:
+        templates = [{"template_ref": register_template(text, root)} for text in get_predefined_templates().values()]
+    start = datetime(2025, 1, 1, 9, 0, 0)
+
+    project_names = []
+    for p in range(num_projects):
+        project_name = f"{prefix}-{p:04d}"
+        project_dir = root / project_name
+        project_dir.mkdir(exist_ok=True)
+        for d in range(docs_per_project):
+            processed_at = start + timedelta(hours=d * 6 + p)
+            metadata = make_document(
+                project_name, d + 1, content_size, rng, rng.choice(templates), processed_at
+            )
+            file_path = project_dir / f"{metadata['generated_filename']}.txt"
+            with open(file_path, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f, ensure_ascii=False, indent=2)
+        project_names.append(project_name)
+    return project_names
+
+
+class SyntheticUpload(io.BytesIO):
+    """In-memory file with the name/type attributes of a Streamlit UploadedFile"""
+
+    def __init__(self, data, name, mime_type):
+        super().__init__(data)
+        self.name = name
+        self.type = mime_type
+        self.size = len(data)
+
+
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def make_pdf_bytes(size_bytes, seed=0, lines_per_page=50):
+    """Build a minimal text PDF (Helvetica, ASCII text) of roughly size_bytes of text"""
+    rng = random.Random(seed)
+    lines = make_text(size_bytes, rng, ASCII_WORDS).splitlines() or [""]
+    pages = [lines[i:i + lines_per_page] for i in range(0, len(lines), lines_per_page)]
+
+    objects = []
+    page_ids = []
+    # 1: catalog, 2: page tree, 3: font, then a (page, content) pair per page
+    next_id = 4
+    for page_lines in pages:
+        page_ids.append(next_id)
+        stream_lines = ["BT", "/F1 10 Tf", "12 TL", "40 800 Td"]
+        for line in page_lines:
+            stream_lines.append(f"({_pdf_escape(line)}) Tj T*")
+        stream_lines.append("ET")
+        stream = "\n".join(stream_lines).encode("latin-1")
+        objects.append((next_id, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {next_id + 1} 0 R >>"
+        ).encode("latin-1")))
+        objects.append((next_id + 1, b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream"))
+        next_id += 2
+
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects = [
+        (1, b"<< /Type /Catalog /Pages 2 0 R >>"),
+        (2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode("latin-1")),
+        (3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    ] + objects
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = {}
+    for obj_id, body in objects:
+        offsets[obj_id] = out.tell()
+        out.write(f"{obj_id} 0 obj\n".encode() + body + b"\nendobj\n")
+    xref_offset = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for obj_id in range(1, len(objects) + 1):
+        out.write(f"{offsets[obj_id]:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def make_docx_bytes(size_bytes, seed=0, table_every=20):
+    """Build a DOCX with headings, paragraphs and periodic action-item tables"""
+    rng = random.Random(seed)
+    document = docx.Document()
+    document.add_heading("Synthetic meeting minutes", level=1)
+    for i, line in enumerate(make_text(size_bytes, rng).splitlines()):
+        document.add_paragraph(line)
+        if table_every and i % table_every == table_every - 1:
+            table = document.add_table(rows=4, cols=3)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = rng.choice(WORDS)
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+
+def make_upload(kind, size_bytes, seed=0):
+    """Build a SyntheticUpload of the given kind ('txt', 'pdf' or 'docx')"""
+    if kind == "txt":
+        data = make_text(size_bytes, random.Random(seed)).encode("utf-8")
+        return SyntheticUpload(data, f"synthetic_{size_bytes}.txt", "text/plain")
+    if kind == "pdf":
+        return SyntheticUpload(make_pdf_bytes(size_bytes, seed), f"synthetic_{size_bytes}.pdf", "application/pdf")
+    if kind == "docx":
+        return SyntheticUpload(
+            make_docx_bytes(size_bytes, seed),
+            f"synthetic_{size_bytes}.docx",
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        )
+    raise ValueError(f"Unknown upload kind: {kind}")
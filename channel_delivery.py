@@ -0,0 +1,248 @@
+"""
+Delivery of summaries to one or more Channel.io group rooms
+
+One message is fanned out to every configured room concurrently. Long messages
+are split into ordered chunks at markdown boundaries (headings, paragraphs,
+lines) so that each post stays under CHANNEL_MAX_MESSAGE_CHARS. Each room has
+its own rate limiter, and failed posts are retried with backoff, honouring
+Retry-After on 429 responses. The caller gets one result per room.
+
+Rooms are configured with CHANNEL_ROOMS as comma-separated name=url pairs,
+e.g. CHANNEL_ROOMS="전략팀=https://...,개발팀=https://...". Without it the
+single CHANNEL_API_URL room is used.
+"""
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from dotenv import load_dotenv
+
+from tracing import attach_span, current_span, span, traced
+
+# Load environment variables
+load_dotenv()
+
+CHANNEL_API_URL = os.getenv("CHANNEL_API_URL", "")
+CHANNEL_ACCESS_KEY = os.getenv("CHANNEL_ACCESS_KEY", "")
+CHANNEL_ACCESS_SECRET = os.getenv("CHANNEL_ACCESS_SECRET", "")
+CHANNEL_ROOMS = os.getenv("CHANNEL_ROOMS", "")
+CHANNEL_MAX_MESSAGE_CHARS = int(os.getenv("CHANNEL_MAX_MESSAGE_CHARS", "3000"))
+CHANNEL_RATE_LIMIT_PER_MINUTE = float(os.getenv("CHANNEL_RATE_LIMIT_PER_MINUTE", "20"))
+CHANNEL_MAX_RETRIES = int(os.getenv("CHANNEL_MAX_RETRIES", "3"))
+CHANNEL_MAX_RETRY_AFTER = float(os.getenv("CHANNEL_MAX_RETRY_AFTER", "60"))
+CHANNEL_TIMEOUT = float(os.getenv("CHANNEL_TIMEOUT", "10"))
+CHANNEL_MAX_WORKERS = int(os.getenv("CHANNEL_MAX_WORKERS", "4"))
+DEFAULT_ROOM_NAME = "기본 채널"
+RETRY_BASE_DELAY = 1.0
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_FENCE = re.compile(r"^\s*(```|~~~)")
+_HEADING = re.compile(r"^#{1,6}\s")
+
+
+def get_rooms():
+    """Configured rooms as {name: url}"""
+    rooms = {}
+    for pair in CHANNEL_ROOMS.split(","):
+        name, _, url = pair.partition("=")
+        if name.strip() and url.strip():
+            rooms[name.strip()] = url.strip()
+    if not rooms and CHANNEL_API_URL:
+        rooms[DEFAULT_ROOM_NAME] = CHANNEL_API_URL
+    return rooms
+
+
+class RateLimiter:
+    """Token bucket allowing `per_minute` posts with bursts of up to `burst`"""
+
+    def __init__(self, per_minute, burst=3):
+        self.rate = per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a post is allowed"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+# Limiters outlive a single delivery so back-to-back sends share each room's budget
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def _limiter_for(room_name):
+    with _limiters_lock:
+        if room_name not in _limiters:
+            _limiters[room_name] = RateLimiter(CHANNEL_RATE_LIMIT_PER_MINUTE)
+        return _limiters[room_name]
+
+
+def _markdown_blocks(text):
+    """Split markdown into blocks: paragraphs, headings and whole fenced code blocks"""
+    blocks = []
+    current = []
+    in_fence = False
+    for line in text.split("\n"):
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        if not in_fence and (not line.strip() or _HEADING.match(line)):
+            if current:
+                blocks.append("\n".join(current))
+                current = []
+            if line.strip():
+                current.append(line)
+            continue
+        current.append(line)
+    if current:
+        blocks.append("\n".join(current))
+    return blocks
+
+
+def _split_oversized(block, max_chars):
+    """Split a block longer than max_chars at line breaks, and hard-split single long lines"""
+    pieces = []
+    current = ""
+    for line in block.split("\n"):
+        while len(line) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        candidate = f"{current}\n{line}" if current else line
+        if len(candidate) > max_chars:
+            pieces.append(current)
+            current = line
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_message(text, max_chars=CHANNEL_MAX_MESSAGE_CHARS):
+    """Split text into ordered chunks of at most max_chars, preferring markdown boundaries"""
+    if len(text) <= max_chars:
+        return [text]
+
+    chunks = []
+    current = ""
+    for block in _markdown_blocks(text):
+        # A heading starts a new chunk once the current one is reasonably full
+        if current and _HEADING.match(block) and len(current) > max_chars // 2:
+            chunks.append(current)
+            current = ""
+        for piece in ([block] if len(block) <= max_chars else _split_oversized(block, max_chars)):
+            candidate = f"{current}\n\n{piece}" if current else piece
+            if len(candidate) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = candidate
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _label_chunks(chunks, max_chars):
+    """Prefix chunks with (n/total) so readers can follow the order; re-split if labels push them over"""
+    if len(chunks) == 1:
+        return chunks
+    text = "\n\n".join(chunks)
+    while True:
+        label_length = len(f"({len(chunks)}/{len(chunks)})\n")
+        if all(len(chunk) + label_length <= max_chars for chunk in chunks):
+            break
+        # Re-splitting can add chunks and lengthen the label (9 -> 10), so check again
+        chunks = split_message(text, max_chars - label_length)
+    return [f"({i}/{len(chunks)})\n{chunk}" for i, chunk in enumerate(chunks, 1)]
+
+
+def _retry_delay(response, attempt):
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            # A server asking for minutes would otherwise hold a send worker (and the UI) that long
+            return min(max(float(retry_after), 0.0), CHANNEL_MAX_RETRY_AFTER)
+        except ValueError:
+            pass
+    return RETRY_BASE_DELAY * (2 ** attempt) * (1 + random.random() * 0.25)
+
+
+def _post(url, text):
+    """Post one chunk, retrying network errors, 429 and 5xx; returns (ok, attempts, error message)"""
+    headers = {
+        "accept": "application/json",
+        "x-access-key": CHANNEL_ACCESS_KEY,
+        "x-access-secret": CHANNEL_ACCESS_SECRET,
+        "Content-Type": "application/json"
+    }
+    payload = {"blocks": [{"type": "text", "value": text}]}
+
+    error = None
+    for attempt in range(CHANNEL_MAX_RETRIES + 1):
+        response = None
+        try:
+            with span("channel.post", attempt=attempt):
+                response = requests.post(url, headers=headers, json=payload, timeout=CHANNEL_TIMEOUT)
+            if response.status_code in (200, 201):
+                return True, attempt + 1, None
+            error = f"{response.status_code} - {response.text[:200]}"
+            if response.status_code not in RETRYABLE_STATUS:
+                return False, attempt + 1, error
+        except requests.RequestException as e:
+            error = str(e)
+        if attempt < CHANNEL_MAX_RETRIES:
+            time.sleep(_retry_delay(response, attempt))
+    return False, CHANNEL_MAX_RETRIES + 1, error
+
+
+def _deliver_to_room(room_name, url, chunks, parent_span=None):
+    """Send the chunks to one room in order, stopping at the first chunk that cannot be delivered"""
+    with attach_span(parent_span), span("channel.room", room=room_name):
+        return _send_chunks(room_name, url, chunks)
+
+
+def _send_chunks(room_name, url, chunks):
+    limiter = _limiter_for(room_name)
+    result = {"room": room_name, "success": True, "sent_chunks": 0, "total_chunks": len(chunks), "attempts": 0,
+              "message": "전송 완료"}
+    for chunk in chunks:
+        limiter.acquire()
+        ok, attempts, error = _post(url, chunk)
+        result["attempts"] += attempts
+        if not ok:
+            result["success"] = False
+            result["message"] = f"{result['sent_chunks'] + 1}/{len(chunks)}번째 메시지 전송 실패: {error}"
+            break
+        result["sent_chunks"] += 1
+    return result
+
+
+@traced()
+def deliver_message(text, rooms=None):
+    """Send text to every room ({name: url}, default: configured rooms) concurrently; one result per room"""
+    rooms = get_rooms() if rooms is None else rooms
+    if not rooms:
+        return []
+
+    chunks = _label_chunks(split_message(text), CHANNEL_MAX_MESSAGE_CHARS)
+    parent_span = current_span()
+    with ThreadPoolExecutor(max_workers=min(CHANNEL_MAX_WORKERS, len(rooms))) as executor:
+        futures = [executor.submit(_deliver_to_room, name, url, chunks, parent_span) for name, url in rooms.items()]
+        return [future.result() for future in futures]
@@ -0,0 +1,217 @@
+"""
+Compaction of old project documents into compressed, append-only segment files
+
+Each project may have a `_segments/` folder next to its loose `*.txt` documents:
+    seg_000001.seg    zlib-compressed document records, appended back to back
+    index.json        filename -> {segment, offset, length, size, changed_at}
+    tombstones.log    one "segment:offset" line per deleted segment record
+
+Readers go through storage.py, which merges loose files and segment records.
+Deleting a compacted document only appends a tombstone; the record is dropped
+when the segment it lives in is rewritten by the next compaction.
+
+Usage (from the repository root):
+    python compaction.py [--project NAME ...] [--min-age-days N]
+"""
+import argparse
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from atomic_files import atomic_write_json
+from tracing import span, traced
+
+SEGMENT_DIRNAME = "_segments"
+INDEX_FILENAME = "index.json"
+TOMBSTONE_FILENAME = "tombstones.log"
+COMPACTION_MIN_AGE_DAYS = float(os.getenv("COMPACTION_MIN_AGE_DAYS", "30"))
+COMPRESSION_LEVEL = 6
+
+
+def _segment_dir(project_dir):
+    return Path(project_dir) / SEGMENT_DIRNAME
+
+
+def load_index(project_dir):
+    """Get the segment index of a project (filename -> location)"""
+    index_path = _segment_dir(project_dir) / INDEX_FILENAME
+    if not index_path.exists():
+        return {}
+    with open(index_path, 'r', encoding='utf-8') as f:
+        return json.load(f)["documents"]
+
+
+def _save_index(project_dir, documents):
+    atomic_write_json(_segment_dir(project_dir) / INDEX_FILENAME, {"version": 1, "documents": documents}, fsync=True)
+
+
+def load_tombstones(project_dir):
+    """Get the set of deleted segment records as "segment:offset" keys"""
+    tombstone_path = _segment_dir(project_dir) / TOMBSTONE_FILENAME
+    if not tombstone_path.exists():
+        return set()
+    with open(tombstone_path, 'r', encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def _location_key(location):
+    return f"{location['segment']}:{location['offset']}"
+
+
+def live_segment_documents(project_dir, exclude=()):
+    """Get (filename, location) of segment records that are not tombstoned, in segment order"""
+    documents = load_index(project_dir)
+    if not documents:
+        return []
+    tombstones = load_tombstones(project_dir)
+    live = [
+        (filename, location) for filename, location in documents.items()
+        if filename not in exclude and _location_key(location) not in tombstones
+    ]
+    live.sort(key=lambda item: (item[1]["segment"], item[1]["offset"]))
+    return live
+
+
+def read_segment_records(project_dir, entries):
+    """Yield (filename, raw bytes) for (filename, location) entries, opening each segment once"""
+    segment_dir = _segment_dir(project_dir)
+    current_name = None
+    segment_file = None
+    try:
+        for filename, location in entries:
+            if location["segment"] != current_name:
+                if segment_file:
+                    segment_file.close()
+                current_name = location["segment"]
+                segment_file = open(segment_dir / current_name, 'rb')
+            segment_file.seek(location["offset"])
+            yield filename, zlib.decompress(segment_file.read(location["length"]))
+    finally:
+        if segment_file:
+            segment_file.close()
+
+
+def tombstone(project_dir, location):
+    """Mark a segment record as deleted"""
+    import storage
+
+    with storage.project_lock(project_dir):
+        with open(_segment_dir(project_dir) / TOMBSTONE_FILENAME, 'a', encoding='utf-8') as f:
+            f.write(_location_key(location) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _next_segment_name(segment_dir):
+    numbers = [int(p.stem.split("_")[1]) for p in segment_dir.glob("seg_*.seg")]
+    return f"seg_{max(numbers, default=0) + 1:06d}.seg"
+
+
+def _document_age_reference(file_path, data):
+    """Timestamp of a loose document's last change, used to decide whether it is old enough to compact"""
+    try:
+        metadata = json.loads(data)
+        return datetime.fromisoformat(metadata.get("updated_at") or metadata["processed_at"])
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return datetime.fromtimestamp(file_path.stat().st_mtime)
+
+
+@traced()
+def compact_project(project_dir, min_age_days=COMPACTION_MIN_AGE_DAYS):
+    """Pack loose documents older than min_age_days into a new segment and drop tombstoned records"""
+    project_dir = Path(project_dir)
+    result = {"compacted": 0, "reclaimed": 0, "rewritten_segments": 0, "bytes_before": 0, "bytes_after": 0}
+    cutoff = datetime.now() - timedelta(days=min_age_days)
+
+    import storage
+
+    # The whole pass holds the project lock: a save, append or delete in between would
+    # be lost when its loose file is unlinked or its segment rewritten
+    with storage.project_lock(project_dir):
+        segment_dir = _segment_dir(project_dir)
+        documents = load_index(project_dir)
+        tombstones = load_tombstones(project_dir)
+
+        # Segments holding deleted records are rewritten with their live records only
+        dirty_segments = {key.split(":")[0] for key in tombstones}
+        carried = [
+            (filename, location) for filename, location in documents.items()
+            if location["segment"] in dirty_segments and _location_key(location) not in tombstones
+        ]
+        carried.sort(key=lambda item: (item[1]["segment"], item[1]["offset"]))
+
+        loose = []
+        for file_path in sorted(project_dir.glob("*.txt")):
+            data = file_path.read_bytes()
+            changed_at = _document_age_reference(file_path, data)
+            if changed_at < cutoff:
+                loose.append((file_path, data, changed_at))
+
+        if not loose and not dirty_segments:
+            return result
+
+        segment_dir.mkdir(exist_ok=True)
+        segment_name = _next_segment_name(segment_dir)
+        new_documents = {
+            filename: location for filename, location in documents.items()
+            if location["segment"] not in dirty_segments
+        }
+
+        with span("segment.write"), open(segment_dir / segment_name, 'wb') as segment_file:
+            for filename, data in read_segment_records(project_dir, carried):
+                compressed = zlib.compress(data, COMPRESSION_LEVEL)
+                new_documents[filename] = {
+                    "segment": segment_name, "offset": segment_file.tell(),
+                    "length": len(compressed), "size": len(data),
+                    "changed_at": documents[filename].get("changed_at")
+                }
+                segment_file.write(compressed)
+            for file_path, data, changed_at in loose:
+                compressed = zlib.compress(data, COMPRESSION_LEVEL)
+                # Kept in the index so delta reads (storage.get_project_files_since) can skip the record
+                new_documents[file_path.name] = {
+                    "segment": segment_name, "offset": segment_file.tell(),
+                    "length": len(compressed), "size": len(data),
+                    "changed_at": changed_at.isoformat()
+                }
+                segment_file.write(compressed)
+                result["bytes_before"] += len(data)
+            result["bytes_after"] = segment_file.tell()
+            segment_file.flush()
+            os.fsync(segment_file.fileno())
+
+        # Index first, then clean up: a crash in between leaves duplicates that readers already skip
+        _save_index(project_dir, new_documents)
+        for file_path, _, _ in loose:
+            file_path.unlink()
+        for name in dirty_segments:
+            (segment_dir / name).unlink(missing_ok=True)
+        (segment_dir / TOMBSTONE_FILENAME).unlink(missing_ok=True)
+        if not new_documents:
+            (segment_dir / segment_name).unlink(missing_ok=True)
+
+        result["compacted"] = len(loose)
+        result["reclaimed"] = len(tombstones)
+        result["rewritten_segments"] = len(dirty_segments)
+        return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compact old TF project documents into segment files")
+    parser.add_argument("--project", action="append", help="Project to compact (repeatable, default: all)")
+    parser.add_argument("--min-age-days", type=float, default=COMPACTION_MIN_AGE_DAYS,
+                        help=f"Only compact documents older than this (default: {COMPACTION_MIN_AGE_DAYS})")
+    args = parser.parse_args(argv)
+
+    from storage import DATA_DIR, get_all_projects
+
+    results = {}
+    for project_name in args.project or get_all_projects():
+        results[project_name] = compact_project(DATA_DIR / project_name, args.min_age_days)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
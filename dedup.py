@@ -0,0 +1,180 @@
+"""
+Near-duplicate transcript detection with MinHash signatures and LSH banding
+
+Signatures are computed from the extracted text at ingest time and stored per
+project in `<project>/_minhash.json`, keyed by the document's generated
+filename. Before a new upload is summarized, its signature is looked up
+against the project's index so the user can skip, replace or link it.
+
+Only documents with a stored signature take part. The source text is not kept,
+so documents saved before signatures existed cannot get one afterwards and are
+never reported as duplicates; `missing_signatures` lists them so the UI can say
+so. Archives carry signatures along (project_archive), except older exports.
+"""
+import hashlib
+import json
+import os
+import re
+import zlib
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from atomic_files import atomic_write_json, dir_lock
+from tracing import traced
+
+NUM_PERM = 128
+BANDS = 32
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 5
+INDEX_FILENAME = "_minhash.json"
+DUPLICATE_SIMILARITY_THRESHOLD = float(os.getenv("DUPLICATE_SIMILARITY_THRESHOLD", "0.8"))
+DUPLICATE_ACTIONS = ("skip", "replace", "link", "append")
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+
+def _normalize(text):
+    """Lowercase and collapse punctuation/whitespace so formatting edits do not change shingles"""
+    return re.sub(r"[\W_]+", " ", text.lower()).strip()
+
+
+def _shingle_hashes(text):
+    text = _normalize(text)
+    if len(text) < SHINGLE_SIZE:
+        text = text.ljust(SHINGLE_SIZE)
+    encoded = {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+    return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in encoded), dtype=np.uint64, count=len(encoded))
+
+
+@traced("minhash")
+def compute_signature(text):
+    """MinHash signature (NUM_PERM 32-bit values) of a text's character shingles"""
+    hashes = _shingle_hashes(text)
+    signature = np.full(NUM_PERM, _MAX_HASH, dtype=np.uint64)
+    # Process in blocks to bound the (block x NUM_PERM) temporary matrix
+    for start in range(0, len(hashes), 4096):
+        block = hashes[start:start + 4096][:, np.newaxis]
+        permuted = ((block * _PERM_A + _PERM_B) % _MERSENNE_PRIME) & _MAX_HASH
+        signature = np.minimum(signature, permuted.min(axis=0))
+    return [int(v) for v in signature]
+
+
+def estimate_similarity(signature_a, signature_b):
+    """Estimated Jaccard similarity of two signatures"""
+    a = np.asarray(signature_a, dtype=np.uint64)
+    b = np.asarray(signature_b, dtype=np.uint64)
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def merge_signatures(signature_a, signature_b):
+    """Signature of the concatenation of two texts (MinHash of a union is the elementwise minimum)"""
+    return [min(a, b) for a, b in zip(signature_a, signature_b)]
+
+
+def _band_keys(signature):
+    return [
+        hashlib.blake2b(
+            np.asarray(signature[i * ROWS_PER_BAND:(i + 1) * ROWS_PER_BAND], dtype=np.uint64).tobytes(),
+            digest_size=8
+        ).hexdigest() + f":{i}"
+        for i in range(BANDS)
+    ]
+
+
+def _index_path(project_dir):
+    return Path(project_dir) / INDEX_FILENAME
+
+
+def load_index(project_dir):
+    """Get the project's signature index: {"documents": {key: entry}, "buckets": {band: [keys]}}"""
+    path = _index_path(project_dir)
+    if not path.exists():
+        return {"num_perm": NUM_PERM, "bands": BANDS, "documents": {}, "buckets": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_index(project_dir, index):
+    """Write the index; call with dir_lock(project_dir) held"""
+    atomic_write_json(_index_path(project_dir), index)
+
+
+def _unbucket(index, document_key):
+    entry = index["documents"].pop(document_key, None)
+    if entry is None:
+        return False
+    for band_key in _band_keys(entry["signature"]):
+        bucket = index["buckets"].get(band_key, [])
+        if document_key in bucket:
+            bucket.remove(document_key)
+        if not bucket:
+            index["buckets"].pop(band_key, None)
+    return True
+
+
+def add_signature(project_dir, document_key, signature, original_filename):
+    """Store the signature of a saved document and add it to the LSH buckets"""
+    with dir_lock(project_dir):
+        index = load_index(project_dir)
+        _unbucket(index, document_key)
+        index["documents"][document_key] = {
+            "signature": signature,
+            "original_filename": original_filename,
+            "added_at": datetime.now().isoformat()
+        }
+        for band_key in _band_keys(signature):
+            index["buckets"].setdefault(band_key, []).append(document_key)
+        _save_index(project_dir, index)
+
+
+def get_signature(project_dir, document_key):
+    """Get the stored signature of a document, or None"""
+    entry = load_index(project_dir)["documents"].get(document_key)
+    return entry["signature"] if entry else None
+
+
+def missing_signatures(project_dir, document_keys):
+    """Keys of the given documents that have no stored signature (invisible to duplicate checks)"""
+    documents = load_index(project_dir)["documents"]
+    return [key for key in document_keys if key not in documents]
+
+
+def remove_signatures(project_dir, document_keys):
+    """Drop signatures of deleted or replaced documents"""
+    with dir_lock(project_dir):
+        index = load_index(project_dir)
+        removed = [key for key in document_keys if _unbucket(index, key)]
+        if removed:
+            _save_index(project_dir, index)
+
+
+@traced()
+def find_near_duplicates(project_dir, signature, threshold=DUPLICATE_SIMILARITY_THRESHOLD):
+    """Find stored documents whose estimated similarity is at least threshold, most similar first"""
+    index = load_index(project_dir)
+    if not index["documents"]:
+        return []
+
+    # LSH: only documents sharing at least one band bucket are compared
+    candidates = set()
+    for band_key in _band_keys(signature):
+        candidates.update(index["buckets"].get(band_key, ()))
+
+    matches = []
+    for document_key in candidates:
+        entry = index["documents"][document_key]
+        similarity = estimate_similarity(signature, entry["signature"])
+        if similarity >= threshold:
+            matches.append({
+                "document_key": document_key,
+                "original_filename": entry.get("original_filename"),
+                "similarity": round(similarity, 3)
+            })
+    matches.sort(key=lambda m: m["similarity"], reverse=True)
+    return matches
@@ -0,0 +1,125 @@
+"""
+Streaming DOCX text extraction
+
+Reads `word/document.xml` (and the page header parts) straight from the zip
+with an incremental XML parser, instead of building python-docx's object
+model. Paragraphs, headings and table rows are emitted in document order and
+every finished body element is dropped right away, so apart from the
+extracted text, memory does not grow with the document.
+
+Output lines:
+    page header text      once per distinct header, before the body
+    # Heading             headings (Title and Heading 1-6 styles) as markdown
+    cell | cell | cell    one line per table row; nested tables stay inside their cell
+"""
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+
+W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+DOCUMENT_PART = "word/document.xml"
+HEADER_PART = re.compile(r"^word/header\d*\.xml$")
+CELL_SEPARATOR = " | "
+
+_HEADING_STYLE = re.compile(r"^(?:heading|제목)\s*(\d)$", re.IGNORECASE)
+
+
+def _heading_level(style_id):
+    if not style_id:
+        return 0
+    if style_id.lower() == "title":
+        return 1
+    match = _HEADING_STYLE.match(style_id)
+    return int(match.group(1)) if match else 0
+
+
+def _iter_part(stream):
+    """Yield ("heading" | "paragraph" | "row", text) for the body of one WordprocessingML part"""
+    container = None     # w:body or w:hdr; finished children are cleared from it
+    paragraphs = []      # open paragraphs: {"text": [...], "style": ...}
+    tables = []          # open tables: each a list of open rows; a row is a list of cells
+    cells = []           # open cells: list of text lines
+    fallback_depth = 0   # inside mc:Fallback, which repeats the mc:Choice content
+
+    for event, elem in iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            if tag == MC_FALLBACK:
+                fallback_depth += 1
+            elif fallback_depth:
+                continue
+            elif tag in (W + "body", W + "hdr"):
+                container = elem
+            elif tag == W + "p":
+                paragraphs.append({"text": [], "style": None})
+            elif tag == W + "tbl":
+                tables.append([])
+            elif tag == W + "tr":
+                tables[-1].append([])
+            elif tag == W + "tc":
+                cells.append([])
+            continue
+
+        if tag == MC_FALLBACK:
+            fallback_depth -= 1
+            continue
+        if fallback_depth:
+            continue
+
+        if tag == W + "t" and paragraphs:
+            paragraphs[-1]["text"].append(elem.text or "")
+        elif tag == W + "tab" and paragraphs:
+            paragraphs[-1]["text"].append("\t")
+        elif tag in (W + "br", W + "cr") and paragraphs:
+            paragraphs[-1]["text"].append("\n")
+        elif tag == W + "pStyle" and paragraphs:
+            paragraphs[-1]["style"] = elem.get(W + "val")
+        elif tag == W + "p":
+            paragraph = paragraphs.pop()
+            text = "".join(paragraph["text"])
+            if cells:
+                if text:
+                    cells[-1].append(text)
+            elif text.strip():
+                level = _heading_level(paragraph["style"])
+                yield ("heading", f"{'#' * level} {text}") if level else ("paragraph", text)
+        elif tag == W + "tc":
+            lines = cells.pop()
+            tables[-1][-1].append(" ".join(lines))
+        elif tag == W + "tr":
+            row = tables[-1].pop()
+            text = CELL_SEPARATOR.join(row)
+            if text.replace(CELL_SEPARATOR, "").strip():
+                if cells:
+                    # Nested table: the row belongs to the enclosing cell
+                    cells[-1].append(text)
+                else:
+                    yield "row", text
+        elif tag == W + "tbl":
+            tables.pop()
+
+        # Body-level element finished: drop it and everything parsed so far
+        if container is not None and not paragraphs and not tables and tag in (W + "p", W + "tbl", W + "sdt"):
+            container.clear()
+
+
+def iter_docx_blocks(file_obj):
+    """Yield ("header" | "heading" | "paragraph" | "row", text) blocks of a .docx file in document order"""
+    with zipfile.ZipFile(file_obj) as zf:
+        names = zf.namelist()
+        seen_headers = set()
+        # header1.xml, header2.xml, ..., header10.xml
+        for name in sorted((n for n in names if HEADER_PART.match(n)), key=lambda n: (len(n), n)):
+            with zf.open(name) as part:
+                for _, text in _iter_part(part):
+                    if text not in seen_headers:
+                        seen_headers.add(text)
+                        yield "header", text
+        with zf.open(DOCUMENT_PART) as part:
+            yield from _iter_part(part)
+
+
+def extract_docx_text(file_obj):
+    """Text of a .docx file, one line per paragraph, heading, table row or page header"""
+    return "\n".join(text for _, text in iter_docx_blocks(file_obj))
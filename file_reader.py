@@ -0,0 +1,162 @@
+import io
+import mimetypes
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+import PyPDF2
+import docx
+
+from docx_stream import extract_docx_text
+from tracing import span, traced
+
+# Prefix of the text returned instead of file content when reading fails
+READ_ERROR_PREFIX = "파일 읽기 중 오류가 발생했습니다"
+UNSUPPORTED_PREFIX = "파일 형식을 지원하지 않습니다"
+# Prefixes of the text returned when an upload is rejected by the memory budgets
+UPLOAD_TOO_LARGE_PREFIX = "업로드 파일이 허용 크기를 초과했습니다"
+MEMORY_BUDGET_PREFIX = "처리 중인 업로드가 많아 메모리 한도를 초과했습니다"
+
+MB = 1024 * 1024
+# Sources larger than this that are neither in memory nor on disk are copied to a temp file for parsing
+UPLOAD_SPILL_THRESHOLD = int(float(os.getenv("UPLOAD_SPILL_THRESHOLD_MB", "8")) * MB)
+# Largest single upload accepted
+UPLOAD_MAX_SIZE = int(float(os.getenv("UPLOAD_MAX_SIZE_MB", "200")) * MB)
+# Memory all uploads being read at the same time may hold together
+UPLOAD_MEMORY_BUDGET = int(float(os.getenv("UPLOAD_MEMORY_BUDGET_MB", "512")) * MB)
+COPY_CHUNK_SIZE = MB
+# DOCX engine: "stream" (docx_stream, includes tables and headers) or "python-docx" (paragraphs only)
+DOCX_ENGINE = os.getenv("DOCX_ENGINE", "stream")
+
+
+class MemoryBudget:
+    """Byte budget shared by concurrent readers; reservations fail fast instead of waiting"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self._lock = threading.Lock()
+
+    def try_reserve(self, size):
+        with self._lock:
+            if self.in_use + size > self.limit:
+                return False
+            self.in_use += size
+            return True
+
+    def release(self, size):
+        with self._lock:
+            self.in_use -= size
+
+
+upload_budget = MemoryBudget(UPLOAD_MEMORY_BUDGET)
+
+
+class LocalFile(io.FileIO):
+    """File on disk exposed with the name/type attributes of a Streamlit UploadedFile"""
+
+    def __init__(self, path):
+        path = Path(path)
+        super().__init__(path, 'rb')
+        self.name = path.name
+        self.type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        self.size = os.fstat(self.fileno()).st_size
+
+
+def _upload_size(uploaded_file):
+    size = getattr(uploaded_file, "size", None)
+    if size is None:
+        size = uploaded_file.seek(0, io.SEEK_END)
+    return size
+
+
+def _has_fileno(uploaded_file):
+    try:
+        uploaded_file.fileno()
+        return True
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        return False
+
+
+def _decode_text(source):
+    """Decode UTF-8 text straight from the upload's buffer, or from a memory mapping of a file on disk"""
+    if isinstance(source, io.BytesIO):
+        with source.getbuffer() as buffer:
+            return str(buffer, "utf-8")
+    if not _has_fileno(source) or os.fstat(source.fileno()).st_size == 0:
+        return str(source.read(), "utf-8")
+    with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        return str(mapped, "utf-8")
+
+
+@contextmanager
+def _open_source(uploaded_file, size):
+    """Yield a seekable binary stream of the upload without copying it into a new bytes object
+
+    A Streamlit UploadedFile is a BytesIO already holding the whole upload, and a
+    LocalFile is on disk: both are parsed in place, since a copy would only add I/O.
+    Other large sources (streams without a file behind them) are copied to a temp
+    file in chunks and parsed from disk.
+    """
+    uploaded_file.seek(0)
+    if isinstance(uploaded_file, io.BytesIO) or _has_fileno(uploaded_file) or size <= UPLOAD_SPILL_THRESHOLD:
+        yield uploaded_file
+    else:
+        with span("upload.spill"), tempfile.TemporaryFile(prefix="upload_") as spill:
+            shutil.copyfileobj(uploaded_file, spill, COPY_CHUNK_SIZE)
+            spill.seek(0)
+            yield spill
+
+
+def _extract_text(source, file_type, file_name):
+    if file_type.startswith('text/') or file_name.endswith('.txt') or file_name.endswith('.md'):
+        # Text files
+        return _decode_text(source)
+        
+    elif file_name.endswith('.pdf'):
+        # PDF files
+        with span("pdf.parse"):
+            pdf_reader = PyPDF2.PdfReader(source)
+            return "".join(page.extract_text() + "\n" for page in pdf_reader.pages)
+            
+    elif file_name.endswith('.docx'):
+        # Word documents
+        with span("docx.parse", engine=DOCX_ENGINE):
+            if DOCX_ENGINE == "python-docx":
+                doc = docx.Document(source)
+                return "\n".join([paragraph.text for paragraph in doc.paragraphs])
+            return extract_docx_text(source)
+        
+    else:
+        # Try to read as text file
+        try:
+            return _decode_text(source)
+        except UnicodeDecodeError:
+            return f"{UNSUPPORTED_PREFIX}: {file_name}\n지원 형식: .txt, .md, .pdf, .docx"
+
+
+@traced()
+def read_file_content(uploaded_file):
+    """Read content from uploaded file based on file type, within the upload memory budgets"""
+    try:
+        file_type = uploaded_file.type
+        file_name = uploaded_file.name.lower()
+        size = _upload_size(uploaded_file)
+        
+        if size > UPLOAD_MAX_SIZE:
+            return f"{UPLOAD_TOO_LARGE_PREFIX}: {size / MB:.1f}MB (최대 {UPLOAD_MAX_SIZE / MB:.0f}MB)"
+        # Decoded text and parser state grow with the upload, so its size is reserved
+        if not upload_budget.try_reserve(size):
+            return f"{MEMORY_BUDGET_PREFIX}. 잠시 후 다시 시도해주세요."
+        
+        try:
+            with _open_source(uploaded_file, size) as source:
+                return _extract_text(source, file_type, file_name)
+        finally:
+            upload_budget.release(size)
+        
+    except Exception as e:
+        return f"{READ_ERROR_PREFIX}: {str(e)}"
@@ -0,0 +1,184 @@
+import os
+import json
+import openai
+from dotenv import load_dotenv
+
+from templates import (
+    DEMO_CONTENT_TEMPLATE,
+    DEMO_EMAIL_TEMPLATE,
+    DEMO_MERGE_TEMPLATE,
+    DELTA_PROMPT_NOTE,
+    EXTRACTION_SYSTEM_PROMPT,
+    MERGE_SYSTEM_PROMPT_TEMPLATE,
+    MERGE_USER_PROMPT_TEMPLATE,
+    STRUCTURED_USER_PROMPT_TEMPLATE,
+    SYSTEM_PROMPT_TEMPLATE,
+    USER_PROMPT_TEMPLATE
+)
+from llm_scheduler import llm_job
+from tracing import span, traced
+
+# Load environment variables
+load_dotenv()
+
+# Configure OpenAI
+openai.api_key = os.getenv("OPENAI_API_KEY", "demo_key")
+
+# Prefix of the text returned instead of a summary when the LLM call fails
+LLM_ERROR_PREFIX = "LLM 처리 중 오류가 발생했습니다"
+EMAIL_ERROR_PREFIX = "이메일 생성 중 오류가 발생했습니다"
+
+
+def is_demo_mode():
+    """Whether the OpenAI API key is missing and demo templates are returned"""
+    return not openai.api_key or openai.api_key == "demo_key"
+
+
+def _chat_completion(messages, max_tokens, **kwargs):
+    """Send a chat request once the LLM scheduler admits it (priority class, token budgets)"""
+    with llm_job(messages, max_tokens) as job:
+        with span("openai.chat"):
+            response = openai.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=messages,
+                max_tokens=max_tokens,
+                **kwargs
+            )
+        job.record_usage(response)
+    return response
+
+
+@traced()
+def process_with_llm(content, template):
+    """Process file content using OpenAI LLM with template"""
+    # Check if API key is properly configured
+    if is_demo_mode():
+        return DEMO_CONTENT_TEMPLATE.format(content_preview=content[:100])
+    
+    try:
+        response = _chat_completion(
+            messages=[
+                {"role": "system", "content": f"다음 템플릿을 사용하여 제공된 내용을 정리하고 구조화해주세요:\n\n{template}"},
+                {"role": "user", "content": f"다음 내용을 위의 템플릿에 맞춰 정리해주세요:\n\n{content}"}
+            ],
+            max_tokens=2000,
+            temperature=0.7
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        return f"{LLM_ERROR_PREFIX}: {str(e)}"
+
+
+@traced()
+def merge_with_llm(existing_summary, new_content, template):
+    """Merge a new transcript segment into an existing summary, sending only the new content"""
+    if is_demo_mode():
+        return existing_summary + DEMO_MERGE_TEMPLATE.format(content_preview=new_content[:100])
+    
+    try:
+        response = _chat_completion(
+            messages=[
+                {"role": "system", "content": MERGE_SYSTEM_PROMPT_TEMPLATE.format(template=template)},
+                {"role": "user", "content": MERGE_USER_PROMPT_TEMPLATE.format(
+                    existing_summary=existing_summary,
+                    new_content=new_content
+                )}
+            ],
+            max_tokens=2000,
+            temperature=0.7
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        return f"{LLM_ERROR_PREFIX}: {str(e)}"
+
+
+@traced()
+def extract_structured_with_llm(content):
+    """Extract decisions and action items from a summary as a dict, or None if the call fails"""
+    if is_demo_mode():
+        return None
+    
+    try:
+        response = _chat_completion(
+            messages=[
+                {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+                {"role": "user", "content": content}
+            ],
+            response_format={"type": "json_object"},
+            max_tokens=1500,
+            temperature=0
+        )
+        return json.loads(response.choices[0].message.content)
+    except Exception:
+        return None
+
+
+@traced()
+def generate_role_based_email(project_name, context_info, project_data, structured_content=None,
+                              last_sent_at=None, combined_content=None):
+    """Generate role-based email using project data and 3-category context information
+
+    With `structured_content` (the recipient's pre-extracted decisions and action
+    items), the prompt uses it instead of the full project history. With
+    `last_sent_at`, `project_data` holds only what changed since the recipient's
+    previous email and the prompt asks for an update rather than a full summary.
+    `combined_content` is the already joined `project_data` (see prefetch.py).
+    """
+    
+    # Combine all project content, counting linked near-duplicate uploads only once
+    if not structured_content and combined_content is None:
+        combined_content = "\n\n".join([item["content"] for item in project_data if not item.get("duplicate_of")])
+    
+    # Check if API key is properly configured
+    if is_demo_mode():
+        return DEMO_EMAIL_TEMPLATE.format(
+            meeting_subject=context_info['meeting_subject'],
+            organization=context_info['organization'],
+            person_name=context_info['person_name'],
+            org_role_description=context_info['org_role_description'],
+            person_role=context_info['person_role'],
+            project_name=project_name
+        )
+    
+    try:
+        system_prompt = SYSTEM_PROMPT_TEMPLATE.format(
+            person_name=context_info['person_name'],
+            organization=context_info['organization'],
+            meeting_subject=context_info['meeting_subject'],
+            org_role_description=context_info['org_role_description'],
+            person_role=context_info['person_role']
+        )
+        
+        if structured_content:
+            user_prompt = STRUCTURED_USER_PROMPT_TEMPLATE.format(
+                project_name=project_name,
+                meeting_subject=context_info['meeting_subject'],
+                structured_content=structured_content,
+                organization=context_info['organization'],
+                person_name=context_info['person_name']
+            )
+        else:
+            user_prompt = USER_PROMPT_TEMPLATE.format(
+                project_name=project_name,
+                meeting_subject=context_info['meeting_subject'],
+                combined_content=combined_content,
+                organization=context_info['organization'],
+                person_name=context_info['person_name']
+            )
+        if last_sent_at:
+            user_prompt += DELTA_PROMPT_NOTE.format(
+                person_name=context_info['person_name'],
+                last_sent_at=last_sent_at
+            )
+        
+        response = _chat_completion(
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            max_tokens=1500,
+            temperature=0.7
+        )
+        return response.choices[0].message.content
+    except Exception as e:
+        return f"{EMAIL_ERROR_PREFIX}: {str(e)}"
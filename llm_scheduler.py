@@ -0,0 +1,336 @@
+"""
+Priority scheduling and token budgets for every LLM call
+
+Each OpenAI request made by llm.py waits here for a slot before it is sent:
+
+- Priority classes: interactive work (the Streamlit UI) always goes before
+  batch work (watch daemon, action item rebuilds) waiting in the same
+  process, and batch may only fill LLM_BATCH_BUDGET_SHARE of the global
+  budget, so a backfill always leaves room for the UI.
+- Token budgets: a sliding window of LLM_BUDGET_WINDOW_SECONDS with a global
+  limit (LLM_TOKENS_PER_WINDOW) and a per-project limit
+  (LLM_PROJECT_TOKENS_PER_WINDOW). A job reserves its estimated tokens
+  (prompt characters / LLM_CHARS_PER_TOKEN plus max_tokens), corrected to
+  the reported usage when the call returns. Reservations are kept in
+  `<data dir>/_llm_usage/usage.log`, so the app and the watch daemon share
+  one budget.
+- Fair sharing: among waiting jobs of the same class, the project that has
+  used the fewest tokens in the window goes first.
+- Admission control: an interactive job is refused (LLMBusyError) when
+  LLM_MAX_QUEUE jobs are already waiting or it has not started within
+  LLM_MAX_WAIT_SECONDS. Batch jobs wait as long as it takes. While a job
+  waits, the `on_wait` callback of its job_context gets its queue position.
+
+Callers set the class and project of the LLM calls made in a block of work
+with `job_context`; calls made outside one are interactive.
+
+Usage (from the repository root):
+    python llm_scheduler.py status
+"""
+import argparse
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: budgets are only shared within one process
+    fcntl = None
+
+from dotenv import load_dotenv
+
+from tracing import span
+
+# Load environment variables
+load_dotenv()
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITY_CLASSES = (INTERACTIVE, BATCH)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_BUDGET_WINDOW_SECONDS = float(os.getenv("LLM_BUDGET_WINDOW_SECONDS", "60"))
+LLM_TOKENS_PER_WINDOW = int(os.getenv("LLM_TOKENS_PER_WINDOW", "90000"))
+LLM_PROJECT_TOKENS_PER_WINDOW = int(os.getenv("LLM_PROJECT_TOKENS_PER_WINDOW", "45000"))
+LLM_BATCH_BUDGET_SHARE = float(os.getenv("LLM_BATCH_BUDGET_SHARE", "0.6"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "20"))
+LLM_MAX_WAIT_SECONDS = float(os.getenv("LLM_MAX_WAIT_SECONDS", "60"))
+LLM_CHARS_PER_TOKEN = float(os.getenv("LLM_CHARS_PER_TOKEN", "1.5"))
+USAGE_DIRNAME = "_llm_usage"
+USAGE_FILENAME = "usage.log"
+WAIT_POLL_SECONDS = 0.5
+# Expired lines are dropped from the usage log once there are this many
+PRUNE_THRESHOLD = 200
+
+LLM_BUSY_MESSAGE = "LLM 요청이 많아 대기열에 들어가지 못했습니다. 잠시 후 다시 시도해주세요"
+
+_job_ids = itertools.count(1)
+_context = threading.local()
+
+
+class LLMBusyError(Exception):
+    """An interactive LLM job was not admitted (queue full or waited too long)"""
+
+
+def estimate_tokens(messages, max_tokens):
+    """Rough token count of a chat request: prompt characters plus the completion limit"""
+    chars = sum(len(message.get("content") or "") for message in messages)
+    return int(chars / LLM_CHARS_PER_TOKEN) + max_tokens
+
+
+@contextmanager
+def job_context(priority=INTERACTIVE, project=None, on_wait=None):
+    """Set the class, project and queue callback (position, waited seconds) of LLM calls in this thread"""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"priority must be one of {PRIORITY_CLASSES}")
+    previous = getattr(_context, "job", None)
+    _context.job = {"priority": priority, "project": project, "on_wait": on_wait}
+    try:
+        yield
+    finally:
+        _context.job = previous
+
+
+class UsageLog:
+    """Token reservations of the last window, in a file shared by every process on the same data folder"""
+
+    def __init__(self, path, window_seconds):
+        self.path = Path(path)
+        self.window_seconds = window_seconds
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def locked(self):
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if fcntl is None:
+                yield
+                return
+            with open(self.path.with_suffix(".lock"), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def entries(self):
+        """Reservations inside the window; call with the log locked"""
+        if not self.path.exists():
+            return []
+        cutoff = time.time() - self.window_seconds
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()
+        entries = []
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry["at"] > cutoff:
+                entries.append(entry)
+        if len(lines) - len(entries) >= PRUNE_THRESHOLD:
+            tmp_path = self.path.with_suffix(".partial")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+            os.replace(tmp_path, self.path)
+        return entries
+
+    def add(self, entry):
+        """Append a reservation (or a correction of one); call with the log locked"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def _totals(entries):
+    """Tokens used in the window: (overall, {project: tokens})"""
+    by_project = {}
+    for entry in entries:
+        by_project[entry["project"]] = by_project.get(entry["project"], 0) + entry["tokens"]
+    return sum(by_project.values()), by_project
+
+
+class LLMJob:
+    """One LLM request waiting for or holding a scheduler slot"""
+
+    def __init__(self, priority, project, tokens):
+        self.id = f"{os.getpid()}-{next(_job_ids)}"
+        self.priority = priority
+        self.project = project
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.reserved_at = None
+        self.actual_tokens = None
+
+    def record_usage(self, response):
+        """Take the real token count from an OpenAI response"""
+        usage = getattr(response, "usage", None)
+        self.actual_tokens = getattr(usage, "total_tokens", None)
+
+
+class Scheduler:
+    """Starts this process's LLM jobs in priority and fair-share order, within the shared token budgets"""
+
+    def __init__(self, usage_log, max_concurrency=LLM_MAX_CONCURRENCY, tokens_per_window=LLM_TOKENS_PER_WINDOW,
+                 project_tokens_per_window=LLM_PROJECT_TOKENS_PER_WINDOW, batch_share=LLM_BATCH_BUDGET_SHARE):
+        self.usage_log = usage_log
+        self.max_concurrency = max_concurrency
+        self.tokens_per_window = tokens_per_window
+        self.project_tokens_per_window = project_tokens_per_window
+        self.batch_share = batch_share
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._running = 0
+        self.stats = {"admitted": 0, "rejected": 0, "waited_jobs": 0, "wait_seconds": 0.0}
+
+    def _ordered(self, by_project):
+        return sorted(self._waiting, key=lambda job: (
+            PRIORITY_CLASSES.index(job.priority), by_project.get(job.project, 0), job.enqueued
+        ))
+
+    def _fits(self, job, used, by_project):
+        # A job larger than a whole budget still runs once nothing else is using it
+        limit = self.tokens_per_window * (self.batch_share if job.priority == BATCH else 1.0)
+        if used and used + job.tokens > limit:
+            return False
+        project_used = by_project.get(job.project, 0)
+        if job.project and project_used and project_used + job.tokens > self.project_tokens_per_window:
+            return False
+        return True
+
+    def _try_start(self, job):
+        """Reserve the job's tokens if it is the first waiting job that fits; call with _cond held"""
+        if self._running >= self.max_concurrency:
+            return False
+        with self.usage_log.locked():
+            used, by_project = _totals(self.usage_log.entries())
+            candidate = next((j for j in self._ordered(by_project) if self._fits(j, used, by_project)), None)
+            if candidate is not job:
+                if candidate is not None:
+                    self._cond.notify_all()
+                return False
+            job.reserved_at = time.time()
+            self.usage_log.add({
+                "at": job.reserved_at, "job": job.id, "priority": job.priority,
+                "project": job.project, "tokens": job.tokens
+            })
+        self._waiting.remove(job)
+        self._running += 1
+        self.stats["admitted"] += 1
+        return True
+
+    def _position(self, job):
+        with self.usage_log.locked():
+            _, by_project = _totals(self.usage_log.entries())
+        return self._ordered(by_project).index(job) + 1
+
+    def _reject(self, job):
+        self._waiting.remove(job)
+        self.stats["rejected"] += 1
+        raise LLMBusyError(LLM_BUSY_MESSAGE)
+
+    def acquire(self, job, on_wait=None):
+        """Block until the job may start; LLMBusyError if an interactive job is not admitted"""
+        with self._cond:
+            if job.priority == INTERACTIVE and len(self._waiting) >= LLM_MAX_QUEUE:
+                self.stats["rejected"] += 1
+                raise LLMBusyError(LLM_BUSY_MESSAGE)
+            self._waiting.append(job)
+            if self._try_start(job):
+                return
+            self.stats["waited_jobs"] += 1
+
+        while True:
+            with self._cond:
+                waited = time.monotonic() - job.enqueued
+                if self._try_start(job):
+                    self.stats["wait_seconds"] += waited
+                    return
+                if job.priority == INTERACTIVE and waited > LLM_MAX_WAIT_SECONDS:
+                    self._reject(job)
+                position = self._position(job)
+            # Outside the lock: the callback may render UI
+            if on_wait:
+                on_wait(position, waited)
+            with self._cond:
+                self._cond.wait(WAIT_POLL_SECONDS)
+
+    def release(self, job):
+        """Free the job's slot and correct its reservation to the tokens actually used"""
+        if job.actual_tokens is not None and job.actual_tokens != job.tokens:
+            with self.usage_log.locked():
+                # Same timestamp as the reservation, so both leave the window together
+                self.usage_log.add({
+                    "at": job.reserved_at, "job": job.id, "priority": job.priority,
+                    "project": job.project, "tokens": job.actual_tokens - job.tokens
+                })
+        with self._cond:
+            self._running -= 1
+            self._cond.notify_all()
+
+    def snapshot(self):
+        """Window usage, limits and this process's queue, for the Performance page and the CLI"""
+        with self.usage_log.locked():
+            used, by_project = _totals(self.usage_log.entries())
+        with self._cond:
+            waiting = [{"priority": job.priority, "project": job.project, "tokens": job.tokens}
+                       for job in self._ordered(by_project)]
+            running = self._running
+        return {
+            "window_seconds": self.usage_log.window_seconds,
+            "used_tokens": used,
+            "tokens_per_window": self.tokens_per_window,
+            "batch_tokens_per_window": int(self.tokens_per_window * self.batch_share),
+            "project_tokens_per_window": self.project_tokens_per_window,
+            "by_project": by_project,
+            "running": running,
+            "max_concurrency": self.max_concurrency,
+            "waiting": waiting,
+            **self.stats
+        }
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """The process-wide scheduler, sharing its usage log through the project data folder"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            import storage
+
+            usage_path = storage.DATA_DIR / USAGE_DIRNAME / USAGE_FILENAME
+            _scheduler = Scheduler(UsageLog(usage_path, LLM_BUDGET_WINDOW_SECONDS))
+        return _scheduler
+
+
+@contextmanager
+def llm_job(messages, max_tokens):
+    """Hold a scheduler slot for one chat request; pass the response to the yielded job's record_usage"""
+    context = getattr(_context, "job", None) or {}
+    job = LLMJob(context.get("priority", INTERACTIVE), context.get("project"), estimate_tokens(messages, max_tokens))
+    scheduler = get_scheduler()
+    with span("llm.queue", priority=job.priority, estimated_tokens=job.tokens):
+        scheduler.acquire(job, context.get("on_wait"))
+    try:
+        yield job
+    finally:
+        scheduler.release(job)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="LLM token budget status")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("status", help="Show the tokens used in the current window")
+    parser.parse_args(argv)
+
+    print(json.dumps(get_scheduler().snapshot(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
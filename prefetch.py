@@ -0,0 +1,112 @@
+"""
+Speculative preparation of a project's email context
+
+Picking a TF in the "담당자별 맞춤 요약" tab starts a background task that
+indexes documents missing from the action item index, loads every document
+and joins the combined content the email prompt is built from. While the
+recipient details are typed in, the work is already done, so the button press
+only has to make the LLM call.
+
+A prepared context is reused while storage.project_version of the project is
+unchanged; a save, append or delete in between makes the next request build
+it again. `stats` counts hits and misses and the time the prefetch saved.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import storage
+from action_items import sync_index
+from llm_scheduler import BATCH, estimate_tokens, job_context
+from tracing import span
+
+PREFETCH_MAX_PROJECTS = int(os.getenv("PREFETCH_MAX_PROJECTS", "4"))
+PREFETCH_WORKERS = 2
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_contexts = OrderedDict()  # project name -> Future of its context, least recently used first
+_lock = threading.Lock()
+
+stats = {"hits": 0, "misses": 0, "saved_ms": 0.0, "waited_ms": 0.0}
+
+
+def prepare_context(project_name):
+    """Index, load and join a project's documents for the email prompt (the result is shared: read only)"""
+    started = time.perf_counter()
+    # Extracting unindexed documents is background work and must not hold up the UI's LLM calls
+    with job_context(BATCH, project_name):
+        sync_index(project_name)
+    # After indexing, which touches the project folder; before reading, like the cursor
+    version = storage.project_version(project_name)
+    cursor = storage.document_cursor(project_name)
+    documents = storage.get_project_files(project_name)
+    # Linked near-duplicate uploads count only once, as in generate_role_based_email
+    combined_content = "\n\n".join(item["content"] for item in documents if not item.get("duplicate_of"))
+    return {
+        "project": project_name,
+        "version": version,
+        "cursor": cursor,
+        "documents": documents,
+        "combined_content": combined_content,
+        "estimated_tokens": estimate_tokens([{"content": combined_content}], 0),
+        "prepare_ms": (time.perf_counter() - started) * 1000
+    }
+
+
+def _fresh_result(project_name, future):
+    """The future's context if it finished, succeeded and still matches the project on disk"""
+    if not future.done() or future.exception() is not None:
+        return None
+    context = future.result()
+    return context if context["version"] == storage.project_version(project_name) else None
+
+
+def prefetch(project_name):
+    """Start preparing the project's context in the background unless a fresh one exists or is underway"""
+    with _lock:
+        future = _contexts.get(project_name)
+        if future is None or (future.done() and _fresh_result(project_name, future) is None):
+            future = _executor.submit(prepare_context, project_name)
+            _contexts[project_name] = future
+        _contexts.move_to_end(project_name)
+        while len(_contexts) > PREFETCH_MAX_PROJECTS:
+            _contexts.popitem(last=False)
+        return future
+
+
+def get_context(project_name):
+    """Get the project's context, waiting for a prefetch in flight, or build it now if there is none
+
+    Returns (context, info); info has "hit", "waited_ms" (spent waiting for the
+    prefetch) and "saved_ms" (preparation time the caller did not wait for).
+    """
+    with _lock:
+        future = _contexts.get(project_name)
+
+    if future is not None:
+        started = time.perf_counter()
+        with span("prefetch.wait"):
+            try:
+                future.result()
+            except Exception:
+                pass
+        waited_ms = (time.perf_counter() - started) * 1000
+        context = _fresh_result(project_name, future)
+        if context is not None:
+            saved_ms = max(context["prepare_ms"] - waited_ms, 0.0)
+            with _lock:
+                stats["hits"] += 1
+                stats["saved_ms"] += saved_ms
+                stats["waited_ms"] += waited_ms
+            return context, {"hit": True, "waited_ms": waited_ms, "saved_ms": saved_ms}
+
+    with span("prefetch.miss"):
+        context = prepare_context(project_name)
+    done = Future()
+    done.set_result(context)
+    with _lock:
+        _contexts[project_name] = done
+        stats["misses"] += 1
+    return context, {"hit": False, "waited_ms": 0.0, "saved_ms": 0.0}
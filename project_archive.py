@@ -0,0 +1,368 @@
+"""
+Streaming export and import of TF projects as ZIP or JSONL archives
+
+Archives are written and read one document at a time, so memory use does not
+grow with the size of a project. Every document and template carries a SHA-256
+checksum that is verified on import. An interrupted import is resumed by
+running it again: progress is checkpointed in a state file next to the archive.
+
+Usage (from the repository root):
+    python project_archive.py export OUT.zip [--project NAME ...]
+    python project_archive.py export OUT.jsonl.gz [--project NAME ...]
+    python project_archive.py import ARCHIVE [--on-conflict skip|overwrite|rename] [--restart]
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import zipfile
+from datetime import datetime
+from pathlib import Path
+
+import storage
+from dedup import add_signature, load_index as load_signature_index, remove_signatures
+from template_registry import get_template, register_template, template_id_for
+from tracing import traced
+
+FORMAT_VERSION = 1
+MANIFEST_NAME = "manifest.jsonl"
+CHECKPOINT_EVERY = 50
+CONFLICT_POLICIES = ("skip", "overwrite", "rename")
+
+
+class ArchiveError(Exception):
+    """Raised when an archive is malformed, truncated or fails checksum verification"""
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _archive_format(path):
+    name = str(path).lower()
+    if name.endswith(".zip"):
+        return "zip"
+    if name.endswith(".jsonl") or name.endswith(".jsonl.gz"):
+        return "jsonl"
+    raise ArchiveError(f"지원하지 않는 아카이브 형식입니다: {path} (지원 형식: .zip, .jsonl, .jsonl.gz)")
+
+
+def _open_text(path, mode, compressed):
+    if compressed:
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _check_name(name):
+    """Reject project or file names that could escape the data directory"""
+    if not name or name in (".", "..") or "/" in name or "\\" in name or name.startswith((".", "_")):
+        raise ArchiveError(f"허용되지 않는 이름입니다: {name!r}")
+    return name
+
+
+def _iter_export_records(project_names):
+    """Yield template and document records (with raw bytes in 'data') one at a time"""
+    seen_templates = set()
+    for project_name in project_names:
+        signatures = load_signature_index(storage.DATA_DIR / project_name)["documents"]
+        for filename, data in storage.iter_raw_documents(project_name):
+            try:
+                ref = json.loads(data).get("template_ref")
+            except ValueError:
+                ref = None
+            if ref and ref["id"] not in seen_templates:
+                seen_templates.add(ref["id"])
+                entry = get_template(ref["id"], storage.DATA_DIR)
+                if entry:
+                    content = entry["content"].encode("utf-8")
+                    yield {"type": "template", "id": entry["id"], "sha256": _sha256(content), "data": content}
+            record = {
+                "type": "document",
+                "project": project_name,
+                "filename": filename,
+                "sha256": _sha256(data),
+                "data": data
+            }
+            # The MinHash signature cannot be recomputed from the summary, so it travels along
+            signature_entry = signatures.get(Path(filename).stem)
+            if signature_entry:
+                record["signature"] = signature_entry["signature"]
+            yield record
+
+
+@traced()
+def export_projects(output_path, project_names=None):
+    """Export projects (default: all) to a ZIP or JSONL archive, streaming document by document"""
+    output_path = Path(output_path)
+    archive_format = _archive_format(output_path)
+    project_names = project_names or storage.get_all_projects()
+    for project_name in project_names:
+        _check_name(project_name)
+
+    header = {
+        "type": "header",
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(),
+        "projects": project_names
+    }
+    counts = {"projects": len(project_names), "documents": 0, "templates": 0, "bytes": 0}
+
+    def count(record):
+        counts["documents" if record["type"] == "document" else "templates"] += 1
+        counts["bytes"] += len(record["data"])
+
+    tmp_path = output_path.with_name(output_path.name + ".partial")
+    if archive_format == "jsonl":
+        with _open_text(tmp_path, "w", str(output_path).lower().endswith(".gz")) as out:
+            out.write(json.dumps(header, ensure_ascii=False) + "\n")
+            for record in _iter_export_records(project_names):
+                count(record)
+                record["data"] = record["data"].decode("utf-8")
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.write(json.dumps({"type": "footer", **counts}, ensure_ascii=False) + "\n")
+    else:
+        # ZipFile allows one open entry at a time, so the manifest is spooled to disk and added last
+        manifest_path = output_path.with_name(output_path.name + ".manifest.partial")
+        with zipfile.ZipFile(tmp_path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as zf:
+            with open(manifest_path, "w", encoding="utf-8") as manifest:
+                manifest.write(json.dumps(header, ensure_ascii=False) + "\n")
+                for record in _iter_export_records(project_names):
+                    count(record)
+                    if record["type"] == "document":
+                        entry_name = f"projects/{record['project']}/{record['filename']}"
+                    else:
+                        entry_name = f"templates/{record['id']}.md"
+                    zf.writestr(entry_name, record.pop("data"))
+                    record["entry"] = entry_name
+                    manifest.write(json.dumps(record, ensure_ascii=False) + "\n")
+                manifest.write(json.dumps({"type": "footer", **counts}, ensure_ascii=False) + "\n")
+            zf.write(manifest_path, MANIFEST_NAME)
+        manifest_path.unlink()
+    os.replace(tmp_path, output_path)
+    return counts
+
+
+def _iter_jsonl_records(archive_path, start):
+    """Yield (index, record) from a JSONL archive, skipping the first `start` records without parsing them"""
+    with _open_text(archive_path, "r", str(archive_path).lower().endswith(".gz")) as f:
+        header = json.loads(f.readline() or "{}")
+        yield -1, header
+        index = 0
+        for line in f:
+            if not line.strip():
+                continue
+            if index < start and not line.startswith('{"type": "footer"'):
+                index += 1
+                continue
+            record = json.loads(line)
+            if record["type"] == "footer":
+                yield index, record
+                return
+            if "data" in record:
+                record["data"] = record["data"].encode("utf-8")
+            yield index, record
+            index += 1
+
+
+def _iter_zip_records(archive_path, start):
+    """Yield (index, record) from a ZIP archive, reading entry data lazily per record"""
+    with zipfile.ZipFile(archive_path, "r") as zf:
+        try:
+            manifest_file = zf.open(MANIFEST_NAME)
+        except KeyError:
+            raise ArchiveError("manifest.jsonl 이 없습니다. 아카이브가 손상되었을 수 있습니다.")
+        with io.TextIOWrapper(manifest_file, encoding="utf-8") as manifest:
+            header = json.loads(manifest.readline() or "{}")
+            yield -1, header
+            index = 0
+            for line in manifest:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record["type"] == "footer":
+                    yield index, record
+                    return
+                if index >= start:
+                    try:
+                        record["data"] = zf.read(record["entry"])
+                    except KeyError:
+                        raise ArchiveError(f"아카이브 항목이 없습니다: {record['entry']}")
+                    yield index, record
+                index += 1
+
+
+def _state_path(archive_path):
+    return archive_path.with_name(archive_path.name + ".import-state.json")
+
+
+def _load_state(archive_path, restart):
+    """Load the import checkpoint if it belongs to this exact archive file"""
+    stat = archive_path.stat()
+    fresh = {"archive_size": stat.st_size, "archive_mtime": stat.st_mtime_ns, "completed": 0, "renamed": {}}
+    state_path = _state_path(archive_path)
+    if restart or not state_path.exists():
+        return fresh
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return fresh
+    if state.get("archive_size") != stat.st_size or state.get("archive_mtime") != stat.st_mtime_ns:
+        return fresh
+    return state
+
+
+def _save_state(archive_path, state):
+    state_path = _state_path(archive_path)
+    tmp_path = state_path.with_name(state_path.name + ".partial")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+
+def _renamed(project_name, data):
+    """Give a conflicting document a fresh ID of the target project; returns (filename, data)"""
+    metadata = json.loads(data)
+    generated_filename, sync_number, today = storage.reserve_document_id(project_name)
+    metadata.update({"generated_filename": generated_filename, "sync_number": sync_number, "date": today})
+    return f"{generated_filename}.txt", json.dumps(metadata, ensure_ascii=False, indent=2).encode("utf-8")
+
+
+def _import_document(record, on_conflict, counts, renamed, checkpoint):
+    """Import one document record; `renamed` maps "project/filename" to the ID a rename gave it"""
+    project_name = _check_name(record["project"])
+    filename = _check_name(record["filename"])
+    data = record["data"]
+    project_dir = storage.DATA_DIR / project_name
+    existing = storage.read_raw_document(project_name, filename)
+
+    if existing is not None:
+        if _sha256(existing) == record["sha256"]:
+            counts["unchanged"] += 1
+            return
+        counts["conflicts"] += 1
+        if on_conflict == "skip":
+            return
+
+    # A new ID is written under the lock it was reserved under (see storage.document_cursor)
+    with storage.project_lock(project_dir):
+        if existing is not None and on_conflict == "rename":
+            source_key = f"{project_name}/{filename}"
+            previous = renamed.get(source_key)
+            stored = storage.read_raw_document(project_name, previous) if previous else None
+            if stored is not None:
+                # Renamed by a run that was killed before its next checkpoint: keep that copy
+                filename, data = previous, stored
+            else:
+                filename, data = _renamed(project_name, data)
+                renamed[source_key] = filename
+                # Saved before the write, so a resumed import finds this copy instead of making another
+                checkpoint()
+                storage.write_raw_document(project_name, filename, data)
+        else:
+            storage.write_raw_document(project_name, filename, data)
+    document_key = Path(filename).stem
+    if record.get("signature"):
+        try:
+            original_filename = json.loads(data).get("original_filename")
+        except ValueError:
+            original_filename = None
+        add_signature(project_dir, document_key, record["signature"], original_filename)
+    else:
+        # Archives from before signatures were exported: do not keep an overwritten document's old one
+        remove_signatures(project_dir, [document_key])
+    counts["imported"] += 1
+
+
+@traced()
+def import_archive(archive_path, on_conflict="skip", restart=False):
+    """Import a ZIP or JSONL archive, verifying checksums and resuming from the last checkpoint"""
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f"on_conflict must be one of {CONFLICT_POLICIES}")
+    archive_path = Path(archive_path)
+    archive_format = _archive_format(archive_path)
+    state = _load_state(archive_path, restart)
+    counts = {
+        "imported": 0, "unchanged": 0, "conflicts": 0, "templates": 0,
+        "resumed_from": state["completed"]
+    }
+
+    records = _iter_jsonl_records if archive_format == "jsonl" else _iter_zip_records
+    footer = None
+    records_seen = 0
+    try:
+        for index, record in records(archive_path, state["completed"]):
+            if record.get("type") == "header":
+                if record.get("format_version") != FORMAT_VERSION:
+                    raise ArchiveError(f"지원하지 않는 아카이브 버전입니다: {record.get('format_version')}")
+                continue
+            if record["type"] == "footer":
+                footer = record
+                records_seen = index
+                break
+
+            if _sha256(record["data"]) != record["sha256"]:
+                raise ArchiveError(f"체크섬이 일치하지 않습니다: {record.get('entry') or record.get('filename') or record['id']}")
+
+            if record["type"] == "template":
+                content = record["data"].decode("utf-8")
+                if template_id_for(content) != record["id"]:
+                    raise ArchiveError(f"템플릿 ID가 내용과 일치하지 않습니다: {record['id']}")
+                register_template(content, storage.DATA_DIR)
+                counts["templates"] += 1
+            else:
+                _import_document(record, on_conflict, counts, state.setdefault("renamed", {}),
+                                 lambda: _save_state(archive_path, state))
+
+            state["completed"] = index + 1
+            if state["completed"] % CHECKPOINT_EVERY == 0:
+                _save_state(archive_path, state)
+    except BaseException:
+        # Keep progress so the next run resumes from here
+        _save_state(archive_path, state)
+        raise
+
+    if footer is None:
+        _save_state(archive_path, state)
+        raise ArchiveError("아카이브 끝(footer)이 없습니다. 내보내기가 중단되었거나 파일이 잘렸을 수 있습니다.")
+    if records_seen != footer["documents"] + footer["templates"]:
+        raise ArchiveError(
+            f"레코드 수가 일치하지 않습니다: {records_seen} != {footer['documents'] + footer['templates']}"
+        )
+
+    _state_path(archive_path).unlink(missing_ok=True)
+    counts["total_records"] = records_seen
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and import TF projects")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export projects to a .zip, .jsonl or .jsonl.gz archive")
+    export_parser.add_argument("output")
+    export_parser.add_argument("--project", action="append", help="Project to export (repeatable, default: all)")
+
+    import_parser = subparsers.add_parser("import", help="Import projects from an archive")
+    import_parser.add_argument("archive")
+    import_parser.add_argument("--on-conflict", choices=CONFLICT_POLICIES, default="skip",
+                               help="What to do when a document exists with different content (default: skip)")
+    import_parser.add_argument("--restart", action="store_true", help="Ignore any saved progress and start over")
+
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "export":
+            result = export_projects(args.output, args.project)
+        else:
+            result = import_archive(args.archive, args.on_conflict, args.restart)
+    except ArchiveError as e:
+        print(f"오류: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Per-recipient send ledger
+
+Records, per project, how far each recipient's last email reached, so the next
+one can cover only the meetings saved or appended to since then ("지난 발송
+이후 변경분" mode) instead of summarizing the whole project again. Stored in
+`<project>/_send_ledger.json`:
+    {"recipients": {person_name: {"cursor": ..., "sent_at": ..., "organization": ...,
+                                  "mode": "full" | "delta", "document_count": N}}}
+
+The cursor comes from storage.document_cursor and is handed back to
+storage.get_project_files_since.
+
+Usage (from the repository root):
+    python send_ledger.py list PROJECT
+    python send_ledger.py reset PROJECT PERSON
+"""
+import argparse
+import json
+from datetime import datetime
+from pathlib import Path
+
+from atomic_files import atomic_write_json, dir_lock
+from storage import DATA_DIR
+
+LEDGER_FILENAME = "_send_ledger.json"
+SEND_MODES = ("full", "delta")
+
+
+def _ledger_path(project_name):
+    return Path(DATA_DIR) / project_name / LEDGER_FILENAME
+
+
+def _recipient_key(person_name):
+    return " ".join((person_name or "").split())
+
+
+def load_ledger(project_name):
+    """Get the project's ledger: {"recipients": {person_name: entry}}"""
+    path = _ledger_path(project_name)
+    if not path.exists():
+        return {"recipients": {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_ledger(project_name, ledger):
+    """Write the ledger; call with the project's dir_lock held"""
+    atomic_write_json(_ledger_path(project_name), ledger, indent=2)
+
+
+def get_last_send(project_name, person_name):
+    """Ledger entry of the recipient's last email for the project, or None"""
+    return load_ledger(project_name)["recipients"].get(_recipient_key(person_name))
+
+
+def record_send(project_name, person_name, cursor, organization=None, mode="full", document_count=0):
+    """Remember that the recipient's email covered the project up to `cursor`"""
+    if mode not in SEND_MODES:
+        raise ValueError(f"mode must be one of {SEND_MODES}")
+    entry = {
+        "cursor": cursor,
+        "sent_at": datetime.now().isoformat(),
+        "organization": organization,
+        "mode": mode,
+        "document_count": document_count
+    }
+    with dir_lock(_ledger_path(project_name).parent):
+        ledger = load_ledger(project_name)
+        ledger["recipients"][_recipient_key(person_name)] = entry
+        _save_ledger(project_name, ledger)
+    return entry
+
+
+def forget_recipient(project_name, person_name):
+    """Drop a recipient so that their next email covers the whole project again"""
+    with dir_lock(_ledger_path(project_name).parent):
+        ledger = load_ledger(project_name)
+        removed = ledger["recipients"].pop(_recipient_key(person_name), None) is not None
+        if removed:
+            _save_ledger(project_name, ledger)
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-recipient send ledger of TF projects")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = subparsers.add_parser("list", help="Show each recipient's last send")
+    list_parser.add_argument("project")
+
+    reset_parser = subparsers.add_parser("reset", help="Make the recipient's next email cover everything")
+    reset_parser.add_argument("project")
+    reset_parser.add_argument("person")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        print(json.dumps(load_ledger(args.project), ensure_ascii=False, indent=2))
+    else:
+        print("reset" if forget_recipient(args.project, args.person) else "not found")
+
+
+if __name__ == "__main__":
+    main()
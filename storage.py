@@ -0,0 +1,490 @@
+import os
+import json
+import hashlib
+import re
+import shutil
+from datetime import datetime
+from pathlib import Path
+
+from action_items import index_document, remove_documents
+from atomic_files import dir_lock
+from compaction import live_segment_documents, load_index, load_tombstones, read_segment_records, tombstone
+from dedup import add_signature, get_signature, merge_signatures, remove_signatures
+from template_registry import register_template
+from tracing import span, traced
+
+# Create data directory if it doesn't exist
+DATA_DIR = Path(os.getenv("TF_DATA_DIR", "tf_projects"))
+DATA_DIR.mkdir(exist_ok=True)
+
+# Documents are identified by their generated filename (날짜_sync_번호). The
+# number comes from a per-project sequence that never repeats, so an ID stays
+# unique after deletes and maps directly to `<project>/<id>.txt` or to the
+# document's entry in the segment index.
+SEQUENCE_FILENAME = "_sequence"
+_SYNC_NUMBER = re.compile(r"_sync_(\d+)\.txt$")
+
+
+def project_lock(project_dir):
+    """Serialize writes to a project across threads and processes (app, watch daemon and CLI tools)"""
+    return dir_lock(project_dir)
+
+
+def _highest_sync_number(project_dir):
+    names = [p.name for p in project_dir.glob("*.txt")] + list(load_index(project_dir))
+    return max((int(m.group(1)) for m in map(_SYNC_NUMBER.search, names) if m), default=0)
+
+
+def _write_sequence(project_dir, number):
+    tmp_path = project_dir / f"{SEQUENCE_FILENAME}.partial"
+    tmp_path.write_text(str(number), encoding='utf-8')
+    os.replace(tmp_path, project_dir / SEQUENCE_FILENAME)
+
+
+def _next_sequence(project_dir, rescan=False):
+    """Reserve the next document number of a project; call with the project lock held"""
+    sequence_path = project_dir / SEQUENCE_FILENAME
+    last = None
+    if sequence_path.exists():
+        last = int(sequence_path.read_text(encoding='utf-8').strip() or 0)
+    if last is None or rescan:
+        # First save of a project (or documents written without the sequence): start after the highest number on disk
+        last = max(last or 0, _highest_sync_number(project_dir))
+    _write_sequence(project_dir, last + 1)
+    return last + 1
+
+
+def _advance_sequence(project_dir, number):
+    """Make sure the sequence never hands out `number` again; call with the project lock held"""
+    sequence_path = project_dir / SEQUENCE_FILENAME
+    if not sequence_path.exists():
+        return  # initialized from the files on disk at the next save
+    if int(sequence_path.read_text(encoding='utf-8').strip() or 0) < number:
+        _write_sequence(project_dir, number)
+
+
+def _document_refs(project_dir):
+    """List a project's documents as ("file", path) or ("segment", (filename, location)) entries"""
+    loose_files = list(project_dir.glob("*.txt"))
+    loose_names = {file_path.name for file_path in loose_files}
+    refs = [("file", file_path) for file_path in loose_files]
+    refs += [("segment", entry) for entry in live_segment_documents(project_dir, exclude=loose_names)]
+    return refs
+
+
+def _source_fingerprint(source_text):
+    """Hash and length of the raw transcript a summary was made from"""
+    return {
+        "sha256": hashlib.sha256(source_text.encode("utf-8")).hexdigest(),
+        "length": len(source_text)
+    }
+
+
+def reserve_document_id(project_name):
+    """Reserve a new document ID; returns (generated_filename, sync_number, date)"""
+    project_dir = DATA_DIR / project_name
+    project_dir.mkdir(exist_ok=True)
+    
+    # Convention: 날짜_sync_번호 (번호 never repeats within a project)
+    today = datetime.now().strftime('%Y%m%d')
+    with project_lock(project_dir):
+        sync_number = _next_sequence(project_dir)
+        generated_filename = f"{today}_sync_{sync_number}"
+        file_path = project_dir / f"{generated_filename}.txt"
+        if file_path.exists() or _live_segment_location(project_dir, file_path.name) is not None:
+            # The sequence fell behind documents written without it (e.g. an import)
+            sync_number = _next_sequence(project_dir, rescan=True)
+            generated_filename = f"{today}_sync_{sync_number}"
+    return generated_filename, sync_number, today
+
+
+@traced()
+def save_project_file(project_name, filename, content, template_used, extra_metadata=None, signature=None,
+                      source_text=None, on_reserved=None):
+    """Save processed file content to project folder (and its MinHash signature, if given)
+
+    Passing the raw `source_text` records its fingerprint, so later uploads of the
+    same growing transcript can be appended with append_project_file.
+    `on_reserved` is called with the new document ID before the file is written
+    (e.g. to record it in a crash-safe ledger).
+    """
+    project_dir = DATA_DIR / project_name
+    template_ref = register_template(template_used, DATA_DIR)
+    
+    # Reserve and write under one lock, so document_cursor never sees a number whose file is missing
+    with project_lock(project_dir):
+        generated_filename, sync_number, today = reserve_document_id(project_name)
+        file_path = project_dir / f"{generated_filename}.txt"
+        if on_reserved is not None:
+            on_reserved(generated_filename)
+        
+        # Create metadata
+        metadata = {
+            "original_filename": filename,
+            "template_ref": template_ref,
+            "processed_at": datetime.now().isoformat(),
+            "content": content,
+            "sync_number": sync_number,
+            "date": today,
+            "generated_filename": generated_filename
+        }
+        if source_text is not None:
+            metadata["source"] = _source_fingerprint(source_text)
+            metadata["segments"] = [{"original_filename": filename, "added_at": metadata["processed_at"],
+                                     "length": len(source_text)}]
+        if extra_metadata:
+            metadata.update(extra_metadata)
+        
+        with span("json.write"):
+            # 'x': a reserved number is never written twice
+            with open(file_path, 'x', encoding='utf-8') as f:
+                json.dump(metadata, f, ensure_ascii=False, indent=2)
+    
+    if signature is not None:
+        add_signature(project_dir, generated_filename, signature, filename)
+    
+    _index_action_items(project_dir, metadata)
+    
+    return file_path, generated_filename
+
+
+def _index_action_items(project_dir, metadata):
+    """Extract decisions and action items once, at save time"""
+    try:
+        index_document(project_dir, metadata)
+    except Exception:
+        # The save itself succeeded; action_items.sync_index retries on the next query
+        pass
+
+
+def get_document(project_name, generated_filename):
+    """Get one document's metadata by its generated filename, or None"""
+    data = read_raw_document(project_name, f"{generated_filename}.txt")
+    return json.loads(data) if data is not None else None
+
+
+def transcript_delta(metadata, source_text):
+    """Split an upload into (new text, whether it continues the stored transcript)
+
+    A re-upload of a growing transcript starts with exactly the text that was
+    summarized before; only what follows it is new. Any other upload is a new
+    segment in its own right.
+    """
+    source = metadata.get("source")
+    if source and len(source_text) >= source["length"]:
+        prefix = source_text[:source["length"]]
+        if _source_fingerprint(prefix)["sha256"] == source["sha256"]:
+            return source_text[source["length"]:], True
+    return source_text, False
+
+
+@traced()
+def append_project_file(project_name, generated_filename, filename, merged_content, source_text,
+                        continued, delta_signature=None):
+    """Replace a document's summary with one that includes a new segment and record the segment"""
+    with project_lock(DATA_DIR / project_name):
+        metadata = _append_locked(project_name, generated_filename, filename, merged_content, source_text,
+                                  continued, delta_signature)
+    
+    # After the lock: extraction may wait on the LLM scheduler, and saves or deletes must not wait with it
+    if metadata is not None:
+        _index_action_items(DATA_DIR / project_name, metadata)
+    
+    return metadata
+
+
+def _append_locked(project_name, generated_filename, filename, merged_content, source_text, continued,
+                   delta_signature):
+    metadata = get_document(project_name, generated_filename)
+    if metadata is None:
+        return None
+    
+    now = datetime.now().isoformat()
+    delta_length = len(source_text) - metadata["source"]["length"] if continued else len(source_text)
+    metadata["content"] = merged_content
+    metadata["updated_at"] = now
+    # The fingerprint follows the latest upload, which is what a further re-upload will start with
+    metadata["source"] = _source_fingerprint(source_text)
+    metadata.setdefault("segments", []).append({
+        "original_filename": filename, "added_at": now, "length": delta_length, "continued": continued
+    })
+    
+    with span("json.write"):
+        write_raw_document(
+            project_name, f"{generated_filename}.txt",
+            json.dumps(metadata, ensure_ascii=False, indent=2).encode("utf-8")
+        )
+    
+    if delta_signature is not None:
+        project_dir = DATA_DIR / project_name
+        signature = get_signature(project_dir, generated_filename)
+        if signature is not None:
+            delta_signature = merge_signatures(signature, delta_signature)
+        add_signature(project_dir, generated_filename, delta_signature, metadata["original_filename"])
+    
+    return metadata
+
+
+def _load_documents(project_dir, refs):
+    """Parse the documents behind a list of refs, skipping unreadable ones"""
+    files = []
+    segment_entries = []
+    for kind, ref in refs:
+        if kind == "segment":
+            segment_entries.append(ref)
+            continue
+        try:
+            with open(ref, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+                files.append(metadata)
+        except:
+            continue
+    
+    for _, data in read_segment_records(project_dir, segment_entries):
+        try:
+            files.append(json.loads(data))
+        except ValueError:
+            continue
+    
+    return files
+
+
+@traced()
+def get_project_files(project_name):
+    """Get all files for a specific project"""
+    project_dir = DATA_DIR / project_name
+    if not project_dir.exists():
+        return []
+    return _load_documents(project_dir, _document_refs(project_dir))
+
+
+def document_cursor(project_name):
+    """Mark the current state of a project for a later get_project_files_since call
+
+    Take the cursor before reading the documents it covers: anything saved in
+    between is then reported again next time rather than missed.
+    """
+    project_dir = DATA_DIR / project_name
+    changed_at = datetime.now().isoformat()
+    if not project_dir.exists():
+        return {"sync_number": 0, "changed_at": changed_at}
+    # save_project_file reserves a number and writes its file under this lock, so every
+    # number up to the highest one on disk belongs to a document that is already there
+    with project_lock(project_dir):
+        return {"sync_number": _highest_sync_number(project_dir), "changed_at": changed_at}
+
+
+def _sync_number(filename):
+    match = _SYNC_NUMBER.search(filename)
+    return int(match.group(1)) if match else 0
+
+
+@traced()
+def get_project_files_since(project_name, cursor):
+    """Get the documents saved or appended to after `cursor`, reading only those
+
+    New documents are found by their sync number in the filename. Older ones
+    only qualify when appended to, which rewrites their loose file (or, once
+    compacted, shows as `changed_at` in the segment index).
+    """
+    project_dir = DATA_DIR / project_name
+    if not project_dir.exists():
+        return []
+    
+    since = cursor["changed_at"]
+    new_refs = []
+    candidate_refs = []
+    for kind, ref in _document_refs(project_dir):
+        if _sync_number(_ref_filename(kind, ref)) > cursor["sync_number"]:
+            new_refs.append((kind, ref))
+        elif kind == "file":
+            if datetime.fromtimestamp(ref.stat().st_mtime).isoformat() > since:
+                candidate_refs.append((kind, ref))
+        elif (ref[1].get("changed_at") or "") > since:
+            candidate_refs.append((kind, ref))
+    
+    # A newer mtime alone (imports, restores) does not make a document changed
+    appended = [
+        metadata for metadata in _load_documents(project_dir, candidate_refs)
+        if (metadata.get("updated_at") or metadata.get("processed_at") or "") > since
+    ]
+    return _load_documents(project_dir, new_refs) + appended
+
+
+def _ref_filename(kind, ref):
+    return ref.name if kind == "file" else ref[0]
+
+
+@traced()
+def get_project_summary(project_name):
+    """Get document count and latest date of a project without parsing its documents"""
+    project_dir = DATA_DIR / project_name
+    if not project_dir.exists():
+        return {"document_count": 0, "latest_date": None}
+    
+    refs = _document_refs(project_dir)
+    # Generated filenames start with the save date: 날짜_sync_번호
+    dates = [name[:8] for name in (_ref_filename(kind, ref) for kind, ref in refs) if name[:8].isdigit()]
+    latest = max(dates) if dates else None
+    return {
+        "document_count": len(refs),
+        "latest_date": f"{latest[:4]}-{latest[4:6]}-{latest[6:]}" if latest else None
+    }
+
+
+def list_document_ids(project_name):
+    """Get the IDs (generated filenames) of a project's documents without reading them"""
+    project_dir = DATA_DIR / project_name
+    if not project_dir.exists():
+        return []
+    return [Path(_ref_filename(kind, ref)).stem for kind, ref in _document_refs(project_dir)]
+
+
+def project_version(project_name):
+    """Cheap marker that changes whenever a project's documents change (for caching listings)"""
+    project_dir = DATA_DIR / project_name
+    marker = []
+    segment_dir = project_dir / "_segments"
+    for path in (project_dir, segment_dir, segment_dir / "index.json", segment_dir / "tombstones.log"):
+        try:
+            marker.append(path.stat().st_mtime_ns)
+        except FileNotFoundError:
+            marker.append(0)
+    return tuple(marker)
+
+
+@traced()
+def list_project_documents(project_name):
+    """Get metadata of every document in a project, without the content (for listings)"""
+    documents = []
+    for metadata in get_project_files(project_name):
+        content = metadata.pop("content", "") or ""
+        metadata["content_length"] = len(content)
+        documents.append(metadata)
+    return documents
+
+
+@traced()
+def get_all_projects():
+    """Get list of all projects"""
+    if not DATA_DIR.exists():
+        return []
+    # Folders starting with "_" hold internal state (ledgers, indexes), not projects
+    return [d.name for d in DATA_DIR.iterdir() if d.is_dir() and not d.name.startswith("_")]
+
+
+def _delete_ref(project_dir, kind, ref):
+    if kind == "file":
+        ref.unlink()
+    else:
+        # Compacted documents are tombstoned until the next compaction
+        tombstone(project_dir, ref[1])
+
+
+def _locate(project_dir, generated_filename):
+    """Find a document by ID: its loose file, else its live segment record (no directory listing)"""
+    filename = f"{generated_filename}.txt"
+    file_path = project_dir / filename
+    if file_path.exists():
+        return "file", file_path
+    location = _live_segment_location(project_dir, filename)
+    if location is not None:
+        return "segment", (filename, location)
+    return None
+
+
+@traced()
+def delete_document(project_name, generated_filename):
+    """Delete a document by its generated filename"""
+    return delete_documents(project_name, [generated_filename]) == 1
+
+
+@traced()
+def delete_documents(project_name, generated_filenames):
+    """Delete documents by generated filename; returns how many were deleted"""
+    project_dir = DATA_DIR / project_name
+    if not project_dir.exists():
+        return 0
+    
+    deleted = []
+    with project_lock(project_dir):
+        for generated_filename in generated_filenames:
+            ref = _locate(project_dir, generated_filename)
+            if ref is not None:
+                _delete_ref(project_dir, *ref)
+                deleted.append(generated_filename)
+    if deleted:
+        remove_signatures(project_dir, deleted)
+        remove_documents(project_dir, deleted)
+    return len(deleted)
+
+
+@traced()
+def delete_entire_project(project_name):
+    """Delete entire project and all its files"""
+    project_dir = DATA_DIR / project_name
+    if not project_dir.exists():
+        return False
+    
+    # Delete the project directory with its files and segments
+    shutil.rmtree(project_dir)
+    return True
+
+
+def iter_raw_documents(project_name):
+    """Yield (filename, raw bytes) for each document of a project, one document at a time"""
+    project_dir = DATA_DIR / project_name
+    if not project_dir.exists():
+        return
+    
+    loose_files = sorted(project_dir.glob("*.txt"))
+    for file_path in loose_files:
+        yield file_path.name, file_path.read_bytes()
+    
+    loose_names = {file_path.name for file_path in loose_files}
+    yield from read_segment_records(project_dir, live_segment_documents(project_dir, exclude=loose_names))
+
+
+def read_raw_document(project_name, filename):
+    """Get the raw bytes of a stored document, or None if it does not exist"""
+    project_dir = DATA_DIR / project_name
+    file_path = project_dir / filename
+    if file_path.exists():
+        return file_path.read_bytes()
+    
+    location = _live_segment_location(project_dir, filename)
+    if location is None:
+        return None
+    return next(read_segment_records(project_dir, [(filename, location)]))[1]
+
+
+def write_raw_document(project_name, filename, data):
+    """Atomically write raw document bytes into a project folder"""
+    project_dir = DATA_DIR / project_name
+    project_dir.mkdir(parents=True, exist_ok=True)
+    
+    file_path = project_dir / filename
+    tmp_path = project_dir / f".{filename}.partial"
+    with project_lock(project_dir):
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, file_path)
+        
+        # The loose file replaces any compacted copy of the same document
+        location = _live_segment_location(project_dir, filename)
+        if location is not None:
+            tombstone(project_dir, location)
+        
+        # Keep the sequence ahead of numbers brought in from elsewhere (imports)
+        match = _SYNC_NUMBER.search(filename)
+        if match:
+            _advance_sequence(project_dir, int(match.group(1)))
+    return file_path
+
+
+def _live_segment_location(project_dir, filename):
+    """Get the segment location of a compacted document unless it was deleted"""
+    location = load_index(project_dir).get(filename)
+    if location is None or f"{location['segment']}:{location['offset']}" in load_tombstones(project_dir):
+        return None
+    return location
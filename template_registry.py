@@ -0,0 +1,239 @@
+"""
+Content-addressed registry of the templates used to structure documents
+
+Documents store only a small template reference ({"id", "name", "version"})
+instead of the full template text. The text lives once in the registry file.
+
+Usage (from the repository root):
+    python template_registry.py migrate    # rewrite legacy documents to template references
+    python template_registry.py list       # show registered templates and versions
+"""
+import hashlib
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from atomic_files import atomic_write_json, dir_lock
+from templates import get_predefined_templates, split_custom_template
+from tracing import traced
+
+REGISTRY_FILENAME = "_template_registry.json"
+UNKNOWN_TEMPLATE_NAME = "사용자 정의 템플릿"
+CUSTOM_SUFFIX = " + 추가 요청사항"
+
+_cache = {}
+
+
+def template_id_for(content):
+    """Content-hashed template ID"""
+    return "tpl_" + hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+
+def _registry_path(data_dir):
+    return Path(data_dir) / REGISTRY_FILENAME
+
+
+def _load(data_dir):
+    """Load the registry, reusing the cached copy while the file is unchanged"""
+    path = _registry_path(data_dir)
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {"templates": {}, "versions": {}}
+
+    cached = _cache.get(str(path))
+    if cached and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        registry = json.load(f)
+    _cache[str(path)] = (mtime, registry)
+    return registry
+
+
+def _save(data_dir, registry):
+    """Write the registry; call with dir_lock(data_dir) held"""
+    path = _registry_path(data_dir)
+    atomic_write_json(path, registry, indent=2)
+    _cache[str(path)] = (path.stat().st_mtime_ns, registry)
+
+
+def _add_entry(registry, content, name, kind, base_id=None, additional_prompt=None):
+    """Add a template version under `name` unless the same content is already registered"""
+    template_id = template_id_for(content)
+    if template_id in registry["templates"]:
+        return registry["templates"][template_id], False
+
+    versions = registry["versions"].setdefault(name, [])
+    entry = {
+        "id": template_id,
+        "name": name,
+        "version": len(versions) + 1,
+        "kind": kind,
+        "base_id": base_id,
+        "additional_prompt": additional_prompt,
+        "content": content,
+        "created_at": datetime.now().isoformat()
+    }
+    registry["templates"][template_id] = entry
+    versions.append(template_id)
+    return entry, True
+
+
+def _register(registry, content):
+    """Register content, inferring base template name and custom variants"""
+    predefined = get_predefined_templates()
+    for name, text in predefined.items():
+        if text == content:
+            return _add_entry(registry, content, name, "base")
+
+    base_content, additional_prompt = split_custom_template(content)
+    if additional_prompt is not None:
+        base_entry, base_changed = _register(registry, base_content)
+        entry, changed = _add_entry(
+            registry, content, base_entry["name"] + CUSTOM_SUFFIX, "custom",
+            base_id=base_entry["id"], additional_prompt=additional_prompt
+        )
+        return entry, changed or base_changed
+
+    # Unknown text (e.g. an older predefined template): name it after its markdown heading
+    first_line = content.strip().splitlines()[0].strip()
+    name = first_line.lstrip("#").strip() if first_line.startswith("#") else UNKNOWN_TEMPLATE_NAME
+    return _add_entry(registry, content, name, "base")
+
+
+def template_ref(entry):
+    """Reference stored in documents in place of the template text"""
+    return {"id": entry["id"], "name": entry["name"], "version": entry["version"]}
+
+
+@traced()
+def register_template(content, data_dir):
+    """Register a template text and return its reference"""
+    if not content or not content.strip():
+        return None
+
+    template_id = template_id_for(content)
+    registry = _load(data_dir)
+    if template_id in registry["templates"]:
+        return template_ref(registry["templates"][template_id])
+
+    # The app, the watch daemon and the CLI tools share the registry: re-read it under the lock
+    with dir_lock(data_dir):
+        registry = _load(data_dir)
+        if template_id in registry["templates"]:
+            return template_ref(registry["templates"][template_id])
+
+        registry = json.loads(json.dumps(registry))
+        # Keep base template versions current before registering anything derived from them
+        for text in get_predefined_templates().values():
+            _register(registry, text)
+        entry, _ = _register(registry, content)
+        _save(data_dir, registry)
+        return template_ref(entry)
+
+
+def get_template(template_id, data_dir):
+    """Get a registry entry by template ID"""
+    return _load(data_dir)["templates"].get(template_id)
+
+
+def list_templates(data_dir):
+    """List all registered templates, grouped by name in version order"""
+    registry = _load(data_dir)
+    return [
+        registry["templates"][template_id]
+        for name in sorted(registry["versions"])
+        for template_id in registry["versions"][name]
+    ]
+
+
+def get_template_text(metadata, data_dir):
+    """Get the template text a document was produced with (reference or legacy inline text)"""
+    ref = metadata.get("template_ref")
+    if ref:
+        entry = get_template(ref["id"], data_dir)
+        return entry["content"] if entry else None
+    return metadata.get("template_used")
+
+
+def describe_template(metadata):
+    """Short label of the template a document was produced with"""
+    ref = metadata.get("template_ref")
+    if ref:
+        return f"{ref['name']} v{ref['version']}"
+    return "사용함 (레거시)" if metadata.get("template_used") else "미사용"
+
+
+@traced()
+def migrate_documents(data_dir):
+    """Rewrite documents that embed template text to store a template reference instead
+
+    `data_dir` is the storage data directory. Documents are read and written through
+    storage, so compacted ones are migrated too (they come back as loose files and
+    are packed again by the next compaction).
+    """
+    import storage
+
+    data_dir = Path(data_dir)
+    result = {"migrated": 0, "skipped": 0, "failed": 0, "bytes_before": 0, "bytes_after": 0}
+    if not data_dir.exists():
+        return result
+
+    for project_dir in sorted(d for d in data_dir.iterdir() if d.is_dir() and not d.name.startswith("_")):
+        project_name = project_dir.name
+        # Find the candidates first: writing while a segment is being read could race a compaction
+        candidates = []
+        for filename, data in storage.iter_raw_documents(project_name):
+            if b'"template_used"' in data:
+                candidates.append(filename)
+            else:
+                result["skipped"] += 1
+
+        for filename in candidates:
+            # Under the project lock, so an append in the app or the daemon is not overwritten
+            with storage.project_lock(project_dir):
+                data = storage.read_raw_document(project_name, filename)
+                try:
+                    metadata = json.loads(data)
+                except (TypeError, ValueError):
+                    result["failed"] += 1
+                    continue
+
+                if "template_used" not in metadata:
+                    result["skipped"] += 1
+                    continue
+
+                migrated = {}
+                for key, value in metadata.items():
+                    if key == "template_used":
+                        migrated["template_ref"] = register_template(value, data_dir)
+                    else:
+                        migrated[key] = value
+
+                migrated_data = json.dumps(migrated, ensure_ascii=False, indent=2).encode("utf-8")
+                storage.write_raw_document(project_name, filename, migrated_data)
+
+            result["migrated"] += 1
+            result["bytes_before"] += len(data)
+            result["bytes_after"] += len(migrated_data)
+    return result
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    from storage import DATA_DIR
+
+    if argv[:1] == ["migrate"]:
+        result = migrate_documents(DATA_DIR)
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    elif argv[:1] == ["list"]:
+        for entry in list_templates(DATA_DIR):
+            print(f"{entry['id']}  {entry['name']} v{entry['version']}  ({entry['kind']}, {len(entry['content'])} chars)")
+    else:
+        print(__doc__)
+
+
+if __name__ == "__main__":
+    main()
@@ -90,6 +90,66 @@ USER_PROMPT_TEMPLATE = """다음 미팅 기록을 분석하여 {organization} 
 - 담당자가 바로 실행 가능한 구체적인 다음 단계 제시
 - 제목과 본문을 포함한 완성된 이메일 형태로 작성"""
 
+# System prompt template for merging a new transcript segment into an existing summary
+MERGE_SYSTEM_PROMPT_TEMPLATE = """다음 템플릿으로 정리된 기존 미팅 기록 요약이 있습니다. 같은 미팅에서 새로 추가된 기록만 제공됩니다.
+
+**작성 지침:**
+1. 기존 요약의 구조와 내용을 유지하면서 새 기록의 내용을 알맞은 항목에 반영하세요
+2. 새 기록이 기존 내용을 변경하거나 번복하면 최신 내용으로 고쳐 쓰세요
+3. 중복되는 내용은 한 번만 남기세요
+4. 템플릿 형식을 그대로 지킨 완성된 요약 전체를 출력하세요
+
+**템플릿:**
+{template}"""
+
+# User prompt template for merging a new transcript segment into an existing summary
+MERGE_USER_PROMPT_TEMPLATE = """**기존 요약:**
+{existing_summary}
+
+**새로 추가된 미팅 기록:**
+{new_content}"""
+
+# Section appended to the existing summary when merging in demo mode
+DEMO_MERGE_TEMPLATE = """
+
+[데모 모드 - 추가된 미팅 기록]
+   - 추가된 내용: {content_preview}..."""
+
+# System prompt for extracting decisions and action items from a meeting summary
+EXTRACTION_SYSTEM_PROMPT = """미팅 기록 요약에서 결정 사항과 액션 아이템을 추출하여 JSON으로만 응답하세요.
+
+형식:
+{"decisions": [{"text": "결정 내용"}],
+ "action_items": [{"task": "할 일", "owner": "담당자 이름 또는 null", "organization": "담당 조직 또는 null",
+                   "due_date": "마감일 또는 null", "priority": "높음 | 중간 | 낮음 | null"}]}
+
+규칙:
+1. 요약에 명시된 내용만 추출하고 추측하지 마세요
+2. 담당자가 팀이나 조직이면 owner는 null, organization에 조직명을 넣으세요
+3. 마감일은 요약에 적힌 표현 그대로 옮기세요"""
+
+# User prompt template for recipient emails built from pre-extracted action items
+STRUCTURED_USER_PROMPT_TEMPLATE = """다음은 TF 프로젝트 미팅 기록에서 미리 추출한 결정 사항과 {person_name}님({organization}) 관련 액션 아이템입니다. 이를 바탕으로 {person_name}님이 받을 맞춤형 요약 이메일을 작성해주세요.
+
+**TF 프로젝트명**: {project_name}
+**미팅 소속 프로젝트**: {meeting_subject}
+**받는 사람**: {person_name} ({organization})
+
+{structured_content}
+
+**요청사항:**
+- {person_name}님과 {organization}의 액션 아이템을 우선순위와 마감일 순으로 정리
+- 관련 결정 사항을 간단히 요약
+- 담당자가 바로 실행 가능한 구체적인 다음 단계 제시
+- 제목과 본문을 포함한 완성된 이메일 형태로 작성"""
+
+# Appended to the user prompt of a "since last update" email
+DELTA_PROMPT_NOTE = """
+
+**발송 범위**: 위 내용은 {person_name}님이 {last_sent_at}에 마지막으로 받은 요약 이후 새로 추가되거나 내용이 이어진 미팅 기록입니다.
+- 이전 요약에서 이미 전달된 내용을 반복하지 말고 변경된 사항만 정리
+- 제목에 업데이트 요약임을 표시"""
+
 # Amazon 6 Pager template
 AMAZON_TEMPLATE = """# 아마존 6 Pager 문서 구조: 사업 계획 Ver.
 
@@ -251,3 +311,28 @@ def get_predefined_templates():
         "GS 김진아 VP 리포트": GS_REPORT_TEMPLATE,
         "Task 미팅 관리": TASK_TEMPLATE
     }
+
+
+# Separator between a base template and its "추가 요청사항" customization
+CUSTOM_PROMPT_SEPARATOR = "--- 추가 요청사항 ---"
+
+
+def build_custom_template(base_template, additional_prompt):
+    """Combine a base template with additional user instructions"""
+    return f"""{base_template}
+
+{CUSTOM_PROMPT_SEPARATOR}
+{additional_prompt.strip()}
+
+위의 기본 템플릿 구조를 따르되, 추가 요청사항을 반영하여 더욱 상세하고 맞춤화된 내용으로 정리해주세요."""
+
+
+def split_custom_template(template):
+    """Split a template built by build_custom_template into (base_template, additional_prompt)"""
+    marker = f"\n\n{CUSTOM_PROMPT_SEPARATOR}\n"
+    if marker not in template:
+        return template, None
+    base_template, rest = template.split(marker, 1)
+    suffix = "\n\n위의 기본 템플릿 구조를 따르되,"
+    additional_prompt = rest.split(suffix, 1)[0]
+    return base_template, additional_prompt
@@ -0,0 +1,200 @@
+import cProfile
+import functools
+import io
+import os
+import pstats
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Number of finished traces kept in memory for the Performance page
+TRACE_HISTORY_SIZE = int(os.getenv("TRACE_HISTORY_SIZE", "100"))
+PROFILE_TOP_N = 40
+
+_traces = deque(maxlen=TRACE_HISTORY_SIZE)
+_traces_lock = threading.Lock()
+_local = threading.local()
+
+
+def _span_stack():
+    """Get the span stack of the current thread"""
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _new_span(name, attrs):
+    return {
+        "name": name,
+        "attrs": attrs,
+        "start": time.perf_counter(),
+        "duration_ms": None,
+        "error": None,
+        "children": []
+    }
+
+
+@contextmanager
+def span(name, **attrs):
+    """Time a stage as a child of the currently open span (no-op outside a trace)"""
+    stack = _span_stack()
+    if not stack:
+        yield None
+        return
+
+    record = _new_span(name, attrs)
+    stack[-1]["children"].append(record)
+    stack.append(record)
+    try:
+        yield record
+    except BaseException as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record["duration_ms"] = (time.perf_counter() - record["start"]) * 1000
+        stack.pop()
+
+
+def current_span():
+    """Get the innermost open span of the current thread, or None"""
+    stack = _span_stack()
+    return stack[-1] if stack else None
+
+
+@contextmanager
+def attach_span(parent):
+    """Continue a trace in a worker thread: spans opened inside become children of `parent`"""
+    if parent is None:
+        yield
+        return
+    stack = _span_stack()
+    stack.append(parent)
+    try:
+        yield
+    finally:
+        stack.pop()
+
+
+def traced(name=None):
+    """Decorator that wraps every call of a function in a span"""
+    def decorator(func):
+        span_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def start_trace(name, profile=False, **attrs):
+    """Open a root span for one request and store it in the trace history when done"""
+    stack = _span_stack()
+    if stack:
+        # Already inside a trace: behave like a nested span
+        with span(name, **attrs) as record:
+            yield record
+        return
+
+    root = _new_span(name, attrs)
+    root["trace_id"] = uuid.uuid4().hex[:12]
+    root["started_at"] = datetime.now().isoformat()
+    root["profile"] = None
+    stack.append(root)
+
+    profiler = None
+    if profile:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active on this thread
+            profiler = None
+
+    try:
+        yield root
+    except BaseException as e:
+        root["error"] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        root["duration_ms"] = (time.perf_counter() - root["start"]) * 1000
+        if profiler is not None:
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(PROFILE_TOP_N)
+            root["profile"] = output.getvalue()
+        stack.clear()
+        with _traces_lock:
+            _traces.append(root)
+
+
+def get_recent_traces(limit=None):
+    """Get finished traces, newest first"""
+    with _traces_lock:
+        traces = list(_traces)
+    traces.reverse()
+    return traces[:limit] if limit else traces
+
+
+def clear_traces():
+    """Drop all stored traces"""
+    with _traces_lock:
+        _traces.clear()
+
+
+def flatten_trace(trace):
+    """Flatten a trace into waterfall rows with offsets relative to the root span"""
+    rows = []
+    origin = trace["start"]
+
+    def walk(record, depth, path):
+        full_path = f"{path}/{record['name']}" if path else record["name"]
+        offset_ms = (record["start"] - origin) * 1000
+        rows.append({
+            "span": record["name"],
+            "path": full_path,
+            "depth": depth,
+            "label": f"{'  ' * depth}{record['name']}",
+            # Unique per row: siblings can share a name (retries, repeated LLM calls)
+            "row_key": f"{len(rows)}|{'  ' * depth}{record['name']}",
+            "start_ms": round(offset_ms, 2),
+            "end_ms": round(offset_ms + (record["duration_ms"] or 0), 2),
+            "duration_ms": round(record["duration_ms"] or 0, 2),
+            "error": record["error"]
+        })
+        for child in record["children"]:
+            walk(child, depth + 1, full_path)
+
+    walk(trace, 0, "")
+    return rows
+
+
+def aggregate_spans(traces):
+    """Aggregate span durations by name across traces (count, mean, p95, max, total)"""
+    durations = {}
+    for trace in traces:
+        for row in flatten_trace(trace):
+            if row["depth"] == 0:
+                continue
+            durations.setdefault(row["span"], []).append(row["duration_ms"])
+
+    stats = []
+    for name, values in durations.items():
+        values.sort()
+        p95_index = min(len(values) - 1, int(round(0.95 * (len(values) - 1))))
+        stats.append({
+            "span": name,
+            "count": len(values),
+            "mean_ms": round(sum(values) / len(values), 2),
+            "p95_ms": round(values[p95_index], 2),
+            "max_ms": round(values[-1], 2),
+            "total_ms": round(sum(values), 2)
+        })
+    stats.sort(key=lambda s: s["total_ms"], reverse=True)
+    return stats
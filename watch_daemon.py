@@ -0,0 +1,512 @@
+"""
+Watch-folder ingestion daemon for STT exports
+
+Watches one or more directories (inotify on Linux, polling elsewhere) and runs
+every new transcript through read_file_content -> process_with_llm ->
+save_project_file. The first-level subfolder of a watched directory names the
+TF project: <watch dir>/<project>/<file>. Files are processed only after their
+size and mtime have been stable for --settle-seconds.
+
+A persistent ledger (tf_projects/_ingest/ledger.jsonl) records every file by
+content hash. LLM results are spooled before saving, and the document ID is
+recorded before the document is written, so a restart neither re-bills the
+LLM for finished work, saves a file twice, nor misses files that arrived
+while the daemon was down.
+
+Usage (from the repository root):
+    python watch_daemon.py --watch /shared/stt [--watch /other/dir] [--map folder=Project]
+        [--default-project NAME] [--template NAME] [--workers 2] [--poll]
+        [--on-duplicate skip|replace|link|append|off] [--similarity 0.8]
+
+With --on-duplicate append, a transcript that keeps growing during a meeting is
+merged into the document it was first saved as: only the new part is sent to
+the LLM.
+"""
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import logging
+import os
+import select
+import signal
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+import storage
+from dedup import (
+    DUPLICATE_ACTIONS, DUPLICATE_SIMILARITY_THRESHOLD, add_signature, compute_signature, find_near_duplicates
+)
+from file_reader import (
+    LocalFile, MEMORY_BUDGET_PREFIX, READ_ERROR_PREFIX, UNSUPPORTED_PREFIX, UPLOAD_TOO_LARGE_PREFIX,
+    read_file_content
+)
+from llm import LLM_ERROR_PREFIX, merge_with_llm, process_with_llm
+from llm_scheduler import BATCH, job_context
+from template_registry import get_template_text
+from templates import get_predefined_templates
+from tracing import start_trace
+
+logger = logging.getLogger("watch_daemon")
+
+SUPPORTED_SUFFIXES = (".txt", ".md", ".pdf", ".docx")
+IGNORED_SUFFIXES = (".part", ".partial", ".tmp", ".crdownload", ".swp")
+DEFAULT_TEMPLATE_NAME = "Task 미팅 관리"
+RESCAN_INTERVAL = 300
+# Ledger statuses that mean a file needs no further work
+SETTLED_STATUSES = ("done", "duplicate")
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = os.O_CLOEXEC
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify:
+    """Minimal ctypes binding for Linux inotify"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError("libc not found")
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(self._libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths = {}
+
+    def add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(str(path)), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed for {path}")
+        self._paths[wd] = Path(path)
+
+    def read_events(self, timeout):
+        """Wait up to timeout seconds and return a list of (path, mask) events"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + name_len].rstrip(b"\0").decode("utf-8", "surrogateescape")
+            offset += name_len
+            directory = self._paths.get(wd)
+            events.append((directory / name if directory and name else directory, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class IngestLedger:
+    """Append-only record of processed files, keyed by project and content hash"""
+
+    def __init__(self, data_dir):
+        self.dir = Path(data_dir) / "_ingest"
+        self.spool_dir = self.dir / "results"
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        self.path = self.dir / "ledger.jsonl"
+        self._lock = threading.Lock()
+        self.entries = {}
+        self.known_paths = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    self.entries[entry["key"]] = entry
+                    if entry["status"] in SETTLED_STATUSES:
+                        self.known_paths[entry["path"]] = (entry["size"], entry["mtime_ns"])
+
+    def record(self, key, **fields):
+        with self._lock:
+            entry = dict(self.entries.get(key, {}), key=key, at=datetime.now().isoformat(), **fields)
+            self.entries[key] = entry
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            if entry["status"] in SETTLED_STATUSES:
+                self.known_paths[entry["path"]] = (entry["size"], entry["mtime_ns"])
+            return entry
+
+    def status(self, key):
+        entry = self.entries.get(key)
+        return entry["status"] if entry else None
+
+    def is_known(self, path, size, mtime_ns):
+        return self.known_paths.get(str(path)) == (size, mtime_ns)
+
+    def spool_result(self, key, processed_content):
+        tmp_path = self.spool_dir / f"{key}.partial"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(processed_content)
+        os.replace(tmp_path, self.spool_dir / f"{key}.txt")
+
+    def spooled_result(self, key):
+        path = self.spool_dir / f"{key}.txt"
+        return path.read_text(encoding="utf-8") if path.exists() else None
+
+    def drop_spool(self, key):
+        (self.spool_dir / f"{key}.txt").unlink(missing_ok=True)
+
+
+class WatchDaemon:
+    """Debounce new files in watched directories and ingest them with a bounded worker pool"""
+
+    def __init__(self, watch_dirs, template, folder_map=None, default_project=None, workers=2,
+                 settle_seconds=5.0, poll_interval=2.0, max_attempts=3, use_inotify=True,
+                 on_duplicate="skip", similarity_threshold=DUPLICATE_SIMILARITY_THRESHOLD):
+        self.watch_dirs = [Path(d).resolve() for d in watch_dirs]
+        self.template = template
+        self.folder_map = folder_map or {}
+        self.default_project = default_project
+        self.settle_seconds = settle_seconds
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.on_duplicate = on_duplicate
+        self.similarity_threshold = similarity_threshold
+        self.max_in_flight = workers * 2
+        self.ledger = IngestLedger(storage.DATA_DIR)
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self.pending = {}
+        self.in_flight = set()
+        self._in_flight_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.inotify = None
+        if use_inotify:
+            try:
+                self.inotify = Inotify()
+            except OSError as e:
+                logger.warning("inotify unavailable (%s), falling back to polling", e)
+
+    # --- discovery -------------------------------------------------------
+
+    def project_for(self, path):
+        """Map a file path to a TF project name, or None if it should be ignored"""
+        for watch_dir in self.watch_dirs:
+            try:
+                relative = path.relative_to(watch_dir)
+            except ValueError:
+                continue
+            if len(relative.parts) == 1:
+                return self.default_project
+            folder = relative.parts[0]
+            project_name = self.folder_map.get(folder, folder)
+            # "_" folders are internal state in the data directory, never projects
+            return None if project_name.startswith(("_", ".")) else project_name
+        return None
+
+    def _is_candidate(self, path):
+        name = path.name
+        if name.startswith((".", "~")) or name.endswith(IGNORED_SUFFIXES):
+            return False
+        return name.lower().endswith(SUPPORTED_SUFFIXES)
+
+    def _watch_tree(self, directory):
+        """Add inotify watches for a directory and its subfolders"""
+        for current, dirnames, _ in os.walk(directory):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            try:
+                self.inotify.add_watch(current)
+            except OSError as e:
+                logger.warning("%s", e)
+
+    def scan(self):
+        """Queue every candidate file not yet processed (startup and periodic safety net)"""
+        for watch_dir in self.watch_dirs:
+            for current, dirnames, filenames in os.walk(watch_dir):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                for filename in filenames:
+                    self.notice(Path(current) / filename)
+
+    def notice(self, path):
+        """Start (or restart) the settle timer for a file"""
+        if not self._is_candidate(path) or self.project_for(path) is None:
+            return
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self.pending.pop(path, None)
+            return
+        if self.ledger.is_known(path, stat.st_size, stat.st_mtime_ns):
+            return
+        signature = (stat.st_size, stat.st_mtime_ns)
+        previous = self.pending.get(path)
+        if previous is None or previous[0] != signature:
+            self.pending[path] = (signature, time.monotonic())
+
+    def _ready_files(self):
+        """Pop files whose size and mtime have not changed for settle_seconds"""
+        now = time.monotonic()
+        ready = []
+        for path, (signature, since) in list(self.pending.items()):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+            current = (stat.st_size, stat.st_mtime_ns)
+            if current != signature:
+                self.pending[path] = (current, now)
+            elif now - since >= self.settle_seconds and stat.st_size > 0:
+                ready.append(path)
+        return ready
+
+    # --- processing ------------------------------------------------------
+
+    def _dispatch(self):
+        for path in self._ready_files():
+            with self._in_flight_lock:
+                if path in self.in_flight:
+                    continue
+                if len(self.in_flight) >= self.max_in_flight:
+                    return  # stay pending until a worker frees up
+                self.in_flight.add(path)
+            del self.pending[path]
+            self.executor.submit(self._process_safely, path)
+
+    def _process_safely(self, path):
+        try:
+            self.process_file(path)
+        except Exception:
+            logger.exception("Unexpected error while ingesting %s", path)
+        finally:
+            with self._in_flight_lock:
+                self.in_flight.discard(path)
+
+    def process_file(self, path):
+        """Ingest one settled file, skipping work already recorded in the ledger"""
+        project_name = self.project_for(path)
+        stat = path.stat()
+        with open(path, 'rb') as f:
+            content_hash = hashlib.file_digest(f, "sha256").hexdigest()
+        key = hashlib.sha256(f"{project_name}\0{content_hash}".encode("utf-8")).hexdigest()[:32]
+        base = {
+            "path": str(path), "project": project_name, "sha256": content_hash,
+            "size": stat.st_size, "mtime_ns": stat.st_mtime_ns
+        }
+
+        status = self.ledger.status(key)
+        if status in SETTLED_STATUSES:
+            # Same content already handled (e.g. a copy or a rename): remember this path too
+            self.ledger.record(key, **base, status=status)
+            return
+        attempts = self.ledger.entries.get(key, {}).get("attempts", 0)
+        if status == "failed" and attempts >= self.max_attempts:
+            # Give up on this version of the file until it changes
+            self.ledger.known_paths[str(path)] = (stat.st_size, stat.st_mtime_ns)
+            return
+
+        # Background ingestion yields to the UI's LLM calls and counts against the project's token budget
+        with job_context(BATCH, project_name), start_trace("ingest", project=project_name, file=path.name):
+            with LocalFile(path) as local_file:
+                content = read_file_content(local_file)
+            if content.startswith(MEMORY_BUDGET_PREFIX):
+                # Transient: leave the file unrecorded so the next scan retries it
+                logger.info("Deferred %s: upload memory budget exhausted", path)
+                return
+            if content.startswith((READ_ERROR_PREFIX, UNSUPPORTED_PREFIX, UPLOAD_TOO_LARGE_PREFIX)):
+                self.ledger.record(key, **base, status="failed", attempts=attempts + 1, error=content[:500])
+                logger.warning("Could not read %s: %s", path, content[:200])
+                return
+
+            signature = compute_signature(content)
+            reserved_filename = self.ledger.entries.get(key, {}).get("reserved_filename")
+            if reserved_filename and storage.get_document(project_name, reserved_filename) is not None:
+                # Saved before a crash that lost the "done" record: finish it instead of saving a second copy
+                add_signature(storage.DATA_DIR / project_name, reserved_filename, signature, path.name)
+                self.ledger.record(key, **base, status="done", generated_filename=reserved_filename)
+                self.ledger.drop_spool(key)
+                logger.info("Recovered %s: already saved as %s", path, reserved_filename)
+                return
+
+            # Near-duplicate check before the LLM call
+            duplicates = []
+            if self.on_duplicate != "off":
+                duplicates = find_near_duplicates(storage.DATA_DIR / project_name, signature, self.similarity_threshold)
+            if duplicates and self.on_duplicate == "skip":
+                self.ledger.record(key, **base, status="duplicate", duplicates=duplicates)
+                logger.info("Skipped %s: near-duplicate of %s", path, duplicates[0]["document_key"])
+                return
+            if duplicates and self.on_duplicate == "append":
+                metadata = storage.get_document(project_name, duplicates[0]["document_key"])
+                if metadata is not None:
+                    self._append(path, key, base, attempts, project_name, metadata, content)
+                    return
+
+            processed_content = self.ledger.spooled_result(key)
+            if processed_content is None:
+                self.ledger.record(key, **base, status="processing", attempts=attempts + 1)
+                processed_content = process_with_llm(content, self.template)
+                if processed_content.startswith(LLM_ERROR_PREFIX):
+                    self.ledger.record(key, **base, status="failed", attempts=attempts + 1,
+                                       error=processed_content[:500])
+                    logger.warning("LLM failed for %s: %s", path, processed_content[:200])
+                    return
+                # Persist the paid-for result before saving, so a crash here never re-bills the LLM
+                self.ledger.spool_result(key, processed_content)
+                self.ledger.record(key, **base, status="summarized", attempts=attempts + 1)
+
+            extra_metadata = None
+            duplicate_keys = [d["document_key"] for d in duplicates]
+            if duplicates and self.on_duplicate == "replace":
+                for document_key in duplicate_keys:
+                    storage.delete_document(project_name, document_key)
+            elif duplicates:
+                extra_metadata = {"duplicate_of": duplicate_keys}
+
+            def record_reserved(reserved_filename):
+                # In the ledger before the document exists, so a retry can tell it was saved
+                self.ledger.record(key, **base, status="saving", reserved_filename=reserved_filename)
+
+            _, generated_filename = storage.save_project_file(
+                project_name, path.name, processed_content, self.template,
+                extra_metadata=extra_metadata, signature=signature, source_text=content,
+                on_reserved=record_reserved
+            )
+            self.ledger.record(key, **base, status="done", generated_filename=generated_filename)
+            self.ledger.drop_spool(key)
+            logger.info("Ingested %s into %s as %s", path, project_name, generated_filename)
+
+    def _append(self, path, key, base, attempts, project_name, metadata, content):
+        """Merge the new part of a growing transcript into the document it was saved as"""
+        generated_filename = metadata["generated_filename"]
+        delta, continued = storage.transcript_delta(metadata, content)
+        if not delta.strip():
+            self.ledger.record(key, **base, status="duplicate", generated_filename=generated_filename)
+            logger.info("Skipped %s: nothing new since %s", path, generated_filename)
+            return
+
+        self.ledger.record(key, **base, status="processing", attempts=attempts + 1)
+        template = get_template_text(metadata, storage.DATA_DIR) or self.template
+        merged_content = merge_with_llm(metadata["content"], delta, template)
+        if merged_content.startswith(LLM_ERROR_PREFIX):
+            self.ledger.record(key, **base, status="failed", attempts=attempts + 1, error=merged_content[:500])
+            logger.warning("LLM merge failed for %s: %s", path, merged_content[:200])
+            return
+
+        storage.append_project_file(
+            project_name, generated_filename, path.name, merged_content, content, continued,
+            delta_signature=compute_signature(delta)
+        )
+        self.ledger.record(key, **base, status="done", generated_filename=generated_filename, appended=len(delta))
+        logger.info("Appended %d new characters of %s to %s", len(delta), path, generated_filename)
+
+    # --- main loop -------------------------------------------------------
+
+    def stop(self, *_):
+        self._stop.set()
+
+    def run(self):
+        logger.info("Watching %s (%s)", ", ".join(map(str, self.watch_dirs)),
+                    "inotify" if self.inotify else "polling")
+        if self.inotify:
+            for watch_dir in self.watch_dirs:
+                self._watch_tree(watch_dir)
+        self.scan()
+        last_scan = time.monotonic()
+
+        try:
+            while not self._stop.is_set():
+                if self.inotify:
+                    timeout = min(self.poll_interval, self.settle_seconds) if self.pending else self.poll_interval
+                    for path, mask in self.inotify.read_events(timeout):
+                        if mask & IN_Q_OVERFLOW or path is None:
+                            self.scan()
+                        elif mask & IN_ISDIR:
+                            if mask & (IN_CREATE | IN_MOVED_TO):
+                                self._watch_tree(path)
+                                self.scan()
+                        else:
+                            self.notice(path)
+                    rescan_interval = RESCAN_INTERVAL
+                else:
+                    self._stop.wait(self.poll_interval)
+                    rescan_interval = self.poll_interval
+
+                if time.monotonic() - last_scan >= rescan_interval:
+                    self.scan()
+                    last_scan = time.monotonic()
+                self._dispatch()
+        finally:
+            self.executor.shutdown(wait=True)
+            if self.inotify:
+                self.inotify.close()
+            logger.info("Stopped")
+
+
+def _parse_map(values):
+    folder_map = {}
+    for value in values or []:
+        folder, _, project = value.partition("=")
+        if not folder or not project:
+            raise argparse.ArgumentTypeError(f"--map expects folder=Project, got {value!r}")
+        folder_map[folder] = project
+    return folder_map
+
+
+def main(argv=None):
+    templates = get_predefined_templates()
+    parser = argparse.ArgumentParser(description="Watch directories and ingest new STT transcripts")
+    parser.add_argument("--watch", action="append", required=True, help="Directory to watch (repeatable)")
+    parser.add_argument("--map", action="append", help="Map a subfolder to a project name: folder=Project (repeatable)")
+    parser.add_argument("--default-project", help="Project for files placed directly in a watched directory")
+    parser.add_argument("--template", default=DEFAULT_TEMPLATE_NAME, choices=list(templates.keys()))
+    parser.add_argument("--workers", type=int, default=2, help="Concurrent ingestion workers (default: 2)")
+    parser.add_argument("--settle-seconds", type=float, default=5.0,
+                        help="Seconds a file must stay unchanged before it is processed (default: 5)")
+    parser.add_argument("--poll-interval", type=float, default=2.0)
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per file before giving up (default: 3)")
+    parser.add_argument("--poll", action="store_true", help="Use polling even where inotify is available")
+    parser.add_argument("--on-duplicate", choices=DUPLICATE_ACTIONS + ("off",), default="skip",
+                        help="What to do with near-duplicates of existing documents (default: skip)")
+    parser.add_argument("--similarity", type=float, default=DUPLICATE_SIMILARITY_THRESHOLD,
+                        help=f"Near-duplicate similarity threshold (default: {DUPLICATE_SIMILARITY_THRESHOLD})")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    daemon = WatchDaemon(
+        args.watch,
+        templates[args.template],
+        folder_map=_parse_map(args.map),
+        default_project=args.default_project,
+        workers=args.workers,
+        settle_seconds=args.settle_seconds,
+        poll_interval=args.poll_interval,
+        max_attempts=args.max_attempts,
+        use_inotify=not args.poll,
+        on_duplicate=args.on_duplicate,
+        similarity_threshold=args.similarity
+    )
+    signal.signal(signal.SIGTERM, daemon.stop)
+    signal.signal(signal.SIGINT, daemon.stop)
+    daemon.run()
+
+
+if __name__ == "__main__":
+    main()